@@ -0,0 +1,88 @@
+import argparse
+import random
+import time
+import openpyxl
+from dds_parse import Device, Participant, Endpoint, Domain
+from dds_analyze import extract_tables, export_analysis
+
+
+# Build a synthetic domain with the given number of endpoints spread over
+# num_topics topics. About 10% of the topics only get writers and 10% only
+# readers so the "without readers/writers" checks have something to report.
+def make_domain(num_endpoints, num_topics, endpoints_per_participant=20, seed=0):
+    rng = random.Random(seed)
+    domain = Domain("0")
+
+    participant = None
+    for i in range(num_endpoints):
+        if i % endpoints_per_participant == 0:
+            p_num = i // endpoints_per_participant
+            device = Device(f"host{p_num % 500}", f"10.0.{p_num // 250 % 250}.{p_num % 250}")
+            participant = Participant(f"app{p_num}", f"{p_num},0,0,1", device, f"/bin/app{p_num}")
+            domain.participants.append(participant)
+
+        topic = rng.randrange(num_topics)
+        if topic % 10 == 0:
+            kind = "writer"
+        elif topic % 10 == 1:
+            kind = "reader"
+        else:
+            kind = rng.choice(["writer", "reader"])
+        reliable = rng.choice(["RELIABLE_RELIABILITY_QOS", "BEST_EFFORT_RELIABILITY_QOS"])
+        domain.endpoints.append(Endpoint(kind, f"Topic{topic}", f"Type{topic}", participant, reliable,
+                                         str(rng.randrange(10, 5000)), "", None, None))
+    return domain
+
+
+# The per-endpoint scan export_analysis used before topics_table was used as
+# the index, kept here as the reference point for the speedup
+def quadratic_unmatched(endpoints):
+    writers_without_readers = {}
+    readers_without_writers = {}
+    for endpoint1 in endpoints:
+        found = False
+        for endpoint2 in endpoints:
+            if endpoint2.topic_name == endpoint1.topic_name:
+                if (endpoint1.kind == "writer" and endpoint2.kind == "reader") or (
+                    endpoint1.kind == "reader" and endpoint2.kind == "writer"
+                ):
+                    found = True
+                    break
+        if not found:
+            if endpoint1.kind == "writer":
+                writers_without_readers.setdefault(endpoint1.topic_name, []).append(endpoint1.participant.name)
+            if endpoint1.kind == "reader":
+                readers_without_writers.setdefault(endpoint1.topic_name, []).append(endpoint1.participant.name)
+    return writers_without_readers, readers_without_writers
+
+
+def run(num_endpoints, num_topics, reference):
+    domain = make_domain(num_endpoints, num_topics)
+
+    start = time.perf_counter()
+    tables = [{}, {}, {}, {}, {}, {}, {}]
+    extract_tables(domain, *tables)
+    extract_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    export_analysis(openpyxl.Workbook(), domain, *tables)
+    analysis_time = time.perf_counter() - start
+
+    line = f"{num_endpoints:>9} endpoints  extract_tables {extract_time:8.3f}s  export_analysis {analysis_time:8.3f}s"
+    if reference:
+        start = time.perf_counter()
+        quadratic_unmatched(domain.endpoints)
+        line += f"  old unmatched scan alone {time.perf_counter() - start:8.3f}s"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time export_analysis on synthetic domains.")
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 10000, 50000, 200000], help="Endpoint counts to run")
+    parser.add_argument("--topics", type=int, default=2000, help="Number of distinct topics (default: 2000)")
+    parser.add_argument("--reference-max", type=int, default=20000,
+                        help="Also time the old O(n^2) scan for sizes up to this many endpoints (default: 20000)")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.topics, size <= args.reference_max)
@@ -0,0 +1,90 @@
+import argparse
+import gc
+import random
+import tracemalloc
+from dds_store import Participant, Endpoint, guid_key
+
+
+# The records dds_capture.py/rtispy.py kept before dds_store.py: plain objects with a
+# __dict__, keys joined into a decimal int, and a new string object per endpoint for the
+# topic/type names (as they come out of the discovery samples)
+class OldParticipant:
+    def __init__(self, name=None, ip=None):
+        self.name = name
+        self.ip = ip
+
+
+class OldEntity:
+    def __init__(self, id=None, topic_name=None, type_name=None, kind=None, p_ip=None, p_name=None, p_guid=None):
+        self.id = id,
+        self.topic_name = topic_name
+        self.type_name = type_name
+        self.kind = kind
+        self.p_ip = p_ip
+        self.p_name = p_name
+        self.p_guid = p_guid
+
+
+def old_key(value):
+    return int(''.join(map(str, value)))
+
+
+# Discovery samples as (key octets, participant key octets, topic name, type name) with
+# endpoints_per_participant endpoints per participant
+def make_samples(num_endpoints, num_topics, endpoints_per_participant, seed=0):
+    rng = random.Random(seed)
+    participants = []
+    samples = []
+    for i in range(num_endpoints):
+        if i % endpoints_per_participant == 0:
+            p_key = [rng.randrange(256) for _ in range(12)] + [0, 0, 1, 0xc1]
+            participants.append((p_key, f"app{len(participants)}", f"10.0.{len(participants) // 250 % 250}.{len(participants) % 250}"))
+        topic = rng.randrange(num_topics)
+        key = p_key[:12] + [(i >> 8) & 255, i & 255, 0, 2 if i % 2 else 7]
+        samples.append((key, p_key, f"Topic{topic}", f"module::Type{topic}"))
+    return participants, samples
+
+
+def build_old(participants, samples):
+    entities = {}
+    for key, p_key, topic_name, type_name in samples:
+        # fresh strings, like the ones returned by every sample
+        entities[old_key(key)] = OldEntity(topic_name="".join(topic_name), type_name="".join(type_name),
+                                           kind="Writer", p_guid=old_key(p_key))
+    return entities, {old_key(p_key): OldParticipant(name, ip) for p_key, name, ip in participants}
+
+
+def build_new(participants, samples):
+    entities = {}
+    for key, p_key, topic_name, type_name in samples:
+        entities[guid_key(key)] = Endpoint(topic_name="".join(topic_name), type_name="".join(type_name),
+                                           kind="Writer", p_guid=guid_key(p_key))
+    return entities, {guid_key(p_key): Participant(name, ip) for p_key, name, ip in participants}
+
+
+def measure(build, participants, samples):
+    gc.collect()
+    tracemalloc.start()
+    result = build(participants, samples)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of the capture records, before and after dds_store.py.")
+    parser.add_argument("endpoints", nargs="?", type=int, default=100000, help="Number of endpoints (default: 100000)")
+    parser.add_argument("--topics", type=int, default=2000, help="Number of distinct topics (default: 2000)")
+    parser.add_argument("--endpoints-per-participant", type=int, default=20, help="Endpoints per participant (default: 20)")
+    args = parser.parse_args()
+
+    participants, samples = make_samples(args.endpoints, args.topics, args.endpoints_per_participant)
+
+    (old_entities, _), old_size = measure(build_old, participants, samples)
+    print(f"old records: {old_size / 1024 / 1024:8.1f} MB  {old_size / args.endpoints:6.0f} bytes/endpoint  "
+          f"{len(samples) - len(old_entities)} endpoints lost to key collisions")
+    del old_entities
+
+    (new_entities, _), new_size = measure(build_new, participants, samples)
+    print(f"dds_store:   {new_size / 1024 / 1024:8.1f} MB  {new_size / args.endpoints:6.0f} bytes/endpoint  "
+          f"{len(samples) - len(new_entities)} endpoints lost to key collisions")
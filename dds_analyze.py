@@ -1,40 +1,18 @@
 import argparse
-import xml.etree.ElementTree as ET
+import datetime
+import io
+import os
+import warnings
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import openpyxl
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
 from openpyxl.styles import Font
-
-class Device:
-    def __init__(self, name=None, ip=None):
-        self.name = name
-        self.ip = ip
-
-
-class Participant:
-    def __init__(self, name=None, key=None, device=None, path=None):
-        self.name = name
-        self.key = key
-        self.device = device
-        self.path = path
-
-
-class Endpoint:
-    def __init__(self, kind=None, topic_name=None, type_name=None, participant=None, reliable=None, max_sample_serialized_size=None, deadline=None, filter=None, multicast=None):
-        self.kind = kind
-        self.topic_name = topic_name
-        self.type_name = type_name
-        self.max_sample_serialized_size = max_sample_serialized_size
-        self.participant = participant
-        self.reliable = reliable
-        self.deadline = deadline
-        self.filter = filter
-        self.multicast = multicast
-
-class Domain:
-    def __init__(self, domain_id=None):
-        self.domain_id = domain_id
-        self.participants = []
-        self.endpoints = []
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from dds_parse import parse_domains, add_cache_arguments, cache_from_args
 
 
 domains = {}
@@ -43,113 +21,6 @@ participants = {}
 endpoints = {}
 
 
-def parse_participant(participant_data):
-
-    participant_name = None
-    participant_key = None
-    property_name = None
-    property_value = None
-    hostname = None
-    filepath = None
-
-    for child in participant_data:
-
-        if child.tag == "key":
-            participant_key = child.find("value").text
-
-        if child.tag == "participant_name":
-            # print("p_name")
-            if child.find("name") is not None:
-                participant_name = child.find("name").text
-
-        if child.tag == "property":
-            # print("p_name")
-
-            for element in child.iter("element"):
-                if element.find("name") is not None:
-                    property_name = element.find("name").text
-
-                if element.find("value") is not None:
-                    property_value = element.find("value").text
-
-                if property_name == "dds.sys_info.hostname":
-                    hostname = property_value
-
-                if property_name == "dds.sys_info.executable_filepath":
-                    filepath = property_value
-
-            if child.find("name") is not None:
-                participant_name = child.find("name").text
-
-        if child.tag == "default_unicast_locators":
-            for element in child.iter("element"):
-                if element.find("address") is not None:
-                    address = element.find("address").text
-                    ip_list = address.split(",")
-                    last_4_ip_list = ip_list[-4:]
-
-                if element.find("kind") is not None:
-                    kind = element.find("kind").text
-                    # If UDP Locator
-                    if kind == "1":
-                        ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
-                        ip_str = ".".join(map(str, ip_bytes))
-                        break
-
-    device = Device(hostname, ip_str)
-    dp = Participant(participant_name, participant_key, device, filepath)
-
-    return dp
-
-
-def parse_endpoint(data_element, kind, participant):
-
-    topic_name = None
-    type_name = None
-    reliable = None
-    deadline = None
-    content_filter = None
-    multicast = None
-    multicast_ip_str = None
-    max_sample_serialized_size = ""
-    
-    for child in data_element:
-        if child.tag == "topic_name":
-            topic_name = child.text
-            # print(topic_name)
-        elif child.tag == "type_name":
-            type_name = child.text
-            # print(type_name)
-        elif child.tag == "max_sample_serialized_size":
-            max_sample_serialized_size = child.text
-        elif child.tag == "reliability":
-            reliable = child.find("kind").text
-        elif child.tag == "deadline":
-            sec = child.find("period/sec").text
-            nanosec = child.find("period/nanosec").text
-            if (sec == "DURATION_INFINITE_SEC" or nanosec == "DURATION_INFINITE_NSEC"):
-                deadline = ""
-            else:
-                deadline = int(sec) + int(nanosec) / 1000000000
-        elif child.tag == "content_filter_property":
-            if child.find("filter_expression") is not None:
-                content_filter = child.find("filter_expression").text
-        elif child.tag == "multicast_locators":
-            for element in child.iter("element"):
-                # print("multicast")
-                if element.find("address") is not None:
-                    multicast = element.find("address").text
-                    ip_list = multicast.split(",")
-                    last_4_ip_list = ip_list[-4:]
-                    ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
-                    multicast_ip_str = ".".join(map(str, ip_bytes))
-
-    endpoint = Endpoint(kind, topic_name, type_name, participant, reliable, max_sample_serialized_size, deadline, content_filter, multicast_ip_str)
-
-    return endpoint
-        
-        
-        
 def extract_tables(domain, devices_table, types_table, topics_table, 
                    topic_reliable_writers, topic_besteffort_writers, 
                    topic_reliable_readers, topic_besteffort_readers):
@@ -264,13 +135,31 @@ def extract_tables(domain, devices_table, types_table, topics_table,
             types_table[endpoint.type_name] = max(types_table[endpoint.type_name], int(endpoint.max_sample_serialized_size))
 
         
+# Excel's sheet size limit, the streaming export continues on another sheet past it
+EXCEL_MAX_ROWS = 1048576
+
+DEVICES_HEADER = ["ip address", "host name"]
+PARTICIPANTS_HEADER = ["host", "ip", "name", "path", "key"]
+ENDPOINTS_HEADER = ["topic name", "type name", "max serialized size", "kind", "host", "ip", "participant", "deadline", "reliable", "filter", "multicast"]
+TOPICS_HEADER = ["topic name", "max serialized size", "writers", "readers", "devices", "participants", "reliable", "filter", "multicast"]
+
+
 # Function to add a table to a worksheet
-def add_table(ws, name):
-    table = Table(displayName=name, ref=ws.dimensions)
+# (write-only worksheets can't read the header back, they pass ref and columns)
+def add_table(ws, name, ref=None, columns=None):
+    table = Table(displayName=name, ref=ref or ws.dimensions)
     style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
                            showLastColumn=False, showRowStripes=False, showColumnStripes=False)
     table.tableStyleInfo = style
-    ws.add_table(table)
+    if not columns:
+        ws.add_table(table)
+        return
+    table.tableColumns = [TableColumn(id=i, name=column) for i, column in enumerate(columns, 1)]
+    table.autoFilter = AutoFilter(ref=table.ref)
+    with warnings.catch_warnings():
+        # write-only sheets always warn that the columns must be added manually, they just were
+        warnings.simplefilter("ignore")
+        ws.add_table(table)
 
 # Function to adjust column widths
 def adjust_column_widths(ws):
@@ -285,99 +174,176 @@ def adjust_column_widths(ws):
                 pass
         ws.column_dimensions[col_letter].width = max_length + 2  # Add some padding
 
-def export_devices(wb, devices_table):
-    print("\nEXPORTING DEVICES")
-    header = ["ip address", "host name"]
-    ws = wb.create_sheet(title="Devices")
-    ws.append(header)
+# The Analysis sheet bolds its headers (actually any cell with a colon in it)
+def is_label(value):
+    return ":" in str(value) and not "::" in str(value)
+
+
+# Writes a sheet of a write-only (constant memory) workbook. The sheet is created right
+# away so it keeps its place in the workbook, the rows are written later by write().
+# openpyxl writes the column widths before the first row, so write() takes a function
+# returning the rows and goes over them twice: the first pass tracks the widths as the
+# rows come, the second one appends them. No cells are kept in memory.
+# Past EXCEL_MAX_ROWS the rows continue on "<title> (2)", "<title> (3)"... each with the
+# header repeated and its own table.
+class StreamingSheet:
+    def __init__(self, wb, title, header=None, table_name=None, bold_labels=False):
+        self.wb = wb
+        self.title = title
+        self.header = header
+        self.table_name = table_name
+        self.bold_labels = bold_labels
+        self.sheets = [wb.create_sheet(title=title)]
+        self.widths = []
+        self.rows_in_sheet = 0
+
+    def track_widths(self, row):
+        for i, value in enumerate(row):
+            if i == len(self.widths):
+                self.widths.append(0)
+            if value:
+                self.widths[i] = max(self.widths[i], len(str(value)))
+
+    # make_rows returns an iterable of (row, bold) pairs, bold makes the first cell bold
+    def write(self, make_rows):
+        if self.header:
+            self.track_widths(self.header)
+        for row, bold in make_rows():
+            self.track_widths(row)
+
+        ws = self.sheets[0]
+        self.start_sheet(ws)
+        for row, bold in make_rows():
+            if self.rows_in_sheet == EXCEL_MAX_ROWS:
+                self.finish_sheet(ws)
+                # next to the sheet it continues, not after the workbook's other sheets
+                ws = self.wb.create_sheet(title=f"{self.title} ({len(self.sheets) + 1})",
+                                          index=self.wb.index(self.sheets[-1]) + 1)
+                self.sheets.append(ws)
+                self.start_sheet(ws)
+            ws.append(self.styled_row(ws, row, bold))
+            self.rows_in_sheet += 1
+        self.finish_sheet(ws)
+
+    def start_sheet(self, ws):
+        for i, width in enumerate(self.widths):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width + 2  # Add some padding
+        self.rows_in_sheet = 0
+        if self.header:
+            ws.append(self.header)
+            self.rows_in_sheet += 1
+
+    def finish_sheet(self, ws):
+        if self.table_name:
+            name = self.table_name if len(self.sheets) == 1 else f"{self.table_name}{len(self.sheets)}"
+            add_table(ws, name, f"A1:{get_column_letter(len(self.header))}{self.rows_in_sheet}", self.header)
+
+    def styled_row(self, ws, row, bold):
+        if not bold and not self.bold_labels:
+            return row
+        cells = []
+        for i, value in enumerate(row):
+            if (bold and i == 0) or (self.bold_labels and is_label(value)):
+                cell = WriteOnlyCell(ws, value=value)
+                cell.font = Font(bold=True)
+                cells.append(cell)
+            else:
+                cells.append(value)
+        return cells
+
+
+def devices_rows(devices_table):
     for d in sorted(devices_table.keys()):
         # devices_table contain a map whose values are a list of two elements
         # the first element is the device name and the second element is a dictionary
         if isinstance(devices_table[d], list) and len(devices_table[d]) > 0:
-            ws.append([d, devices_table[d][0]])
+            yield [d, devices_table[d][0]]
         else:
-            ws.append([d, "Unknown"])
+            yield [d, "Unknown"]
+
+def participants_rows(participants):
+    sorted_values = sorted(participants, key=lambda item: item.device.ip)
+    for p in sorted_values:
+        yield [p.device.name, p.device.ip, p.name, p.path, p.key]
+
+def entities_rows(endpoints, types_table):
+    sorted_values = sorted(endpoints, key=lambda item: (item.topic_name, item.participant.device.ip, item.participant.key, item.kind))
+    for entity in sorted_values:
+        yield [entity.topic_name, entity.type_name, types_table[entity.type_name],
+               entity.kind, entity.participant.device.name, entity.participant.device.ip, entity.participant.name,
+               entity.deadline, entity.reliable, entity.filter, entity.multicast]
+
+def topics_rows(types_table, topics_table):
+    for topic, data in sorted(topics_table.items(), key=lambda item: (-item[1]["reader"]["num"], item[0])):
+        devices = len(topics_table[topic]["devices"])
+        participants = len(topics_table[topic]["participants"])
+        reliable = "RELIABLE" if topics_table[topic]["writer"]["reliable"] == "RELIABLE" and topics_table[topic]["reader"]["reliable"] == "RELIABLE" else "BEST_EFFORT"
+        filter = len(topics_table[topic]["reader"]["content-filters"])
+        yield [topic, types_table[topics_table[topic]["type"]], topics_table[topic]["writer"]["num"], topics_table[topic]["reader"]["num"],
+               devices, participants, reliable, filter,
+               f'{topics_table[topic]["reader"]["multicast"]}']
+
+def export_devices(wb, devices_table):
+    print("\nEXPORTING DEVICES")
+    ws = wb.create_sheet(title="Devices")
+    ws.append(DEVICES_HEADER)
+    for row in devices_rows(devices_table):
+        ws.append(row)
     add_table(ws, "DevicesTable")
     adjust_column_widths(ws)
 
 def export_participants(wb, participants):
     print("\nEXPORTING PARTICIPANTS")
-    header = ["host", "ip", "name", "path", "key"]
     ws = wb.create_sheet(title="Participants")
-    ws.append(header)
-    sorted_values = sorted(participants, key=lambda item: item.device.ip)
-    for p in sorted_values:
-        ws.append([p.device.name, p.device.ip, p.name, p.path, p.key])
+    ws.append(PARTICIPANTS_HEADER)
+    for row in participants_rows(participants):
+        ws.append(row)
     add_table(ws, "ParticipantsTable")
     adjust_column_widths(ws)
 
-def export_entities(wb, endpoints, types_table, topics_table):    
+def export_entities(wb, endpoints, types_table, topics_table):
     print("\nEXPORTING ENTITIES")
-    header = ["topic name", "type name", "max serialized size", "kind", "host", "ip", "participant", "deadline", "reliable", "filter", "multicast"]
     ws = wb.create_sheet(title="Endpoints")
-    ws.append(header)
-    sorted_values = sorted(endpoints, key=lambda item: (item.topic_name, item.participant.device.ip, item.participant.key, item.kind))
-    for entity in sorted_values:
-        ws.append([entity.topic_name, entity.type_name, types_table[entity.type_name],
-                   entity.kind, entity.participant.device.name, entity.participant.device.ip, entity.participant.name,
-                   entity.deadline, entity.reliable, entity.filter, entity.multicast])
+    ws.append(ENDPOINTS_HEADER)
+    for row in entities_rows(endpoints, types_table):
+        ws.append(row)
     add_table(ws, "EndpointsTable")
     adjust_column_widths(ws)
 
 def export_topics(wb, types_table, topics_table):
     print("\nEXPORTING TOPICS")
-    header = ["topic name", "max serialized size", "writers", "readers", "devices", "participants", "reliable", "filter", "multicast"]
     ws = wb.create_sheet(title="Topics")
-    ws.append(header)
-         
-    for topic, data in sorted(topics_table.items(), key=lambda item: (-item[1]["reader"]["num"], item[0])):
-        devices = len(topics_table[topic]["devices"])
-        participants = len(topics_table[topic]["participants"])
-        reliable = "RELIABLE" if topics_table[topic]["writer"]["reliable"] == "RELIABLE" and topics_table[topic]["reader"]["reliable"] == "RELIABLE" else "BEST_EFFORT"
-        filter = len(topics_table[topic]["reader"]["content-filters"])
-        ws.append([topic, types_table[topics_table[topic]["type"]], topics_table[topic]["writer"]["num"], topics_table[topic]["reader"]["num"], 
-                   devices, participants, reliable, filter, 
-                   f'{topics_table[topic]["reader"]["multicast"]}'])
-
+    ws.append(TOPICS_HEADER)
+    for row in topics_rows(types_table, topics_table):
+        ws.append(row)
     add_table(ws, "TopicsTable")
     adjust_column_widths(ws)
 
-def export_analysis(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, topic_besteffort_writers,
-                    topic_reliable_readers, topic_besteffort_readers):
-    ws = wb.active
-    ws.title = "Analysis"
+# Topics with writers but no readers (and readers but no writers), with reliable writers
+# but only best effort readers and with more than one data type
+def find_issues(endpoints, topics_table, topic_reliable_writers, topic_reliable_readers, topic_besteffort_readers):
 
-    participants = domain.participants
-    endpoints = domain.endpoints
-    
-    
     # check for Topics with writers but no readers and readers but no writers
+    # topics_table already counts the writers and readers of every topic, so
+    # each endpoint only needs one lookup for the count of the opposite kind
     writers_without_readers = {}
     readers_without_writers = {}
-    for endpoint1 in endpoints:
-        found = False
+    for endpoint in endpoints:
 
         # possible that there is no participant name, if not, use key
-        participant_name = endpoint1.participant.name
+        participant_name = endpoint.participant.name
         if participant_name == None:
-            participant_name = endpoint1.participant.key
-
-        for endpoint2 in endpoints:
-            if endpoint2.topic_name == endpoint1.topic_name:
-                if (endpoint1.kind == "writer" and endpoint2.kind == "reader") or (
-                    endpoint1.kind == "reader" and endpoint2.kind == "writer"
-                ):
-                    found = True
-                    break
-        if not found:
-            if endpoint1.kind == "writer":
-                if not endpoint1.topic_name in writers_without_readers:
-                    writers_without_readers[endpoint1.topic_name] = list()
-                writers_without_readers[endpoint1.topic_name].append(participant_name)
-            if endpoint1.kind == "reader":
-                if not endpoint1.topic_name in readers_without_writers:
-                    readers_without_writers[endpoint1.topic_name] = list()
-                readers_without_writers[endpoint1.topic_name].append(participant_name)
+            participant_name = endpoint.participant.key
+
+        topic_counts = topics_table[endpoint.topic_name]
+        if endpoint.kind == "writer" and topic_counts["reader"]["num"] == 0:
+            if not endpoint.topic_name in writers_without_readers:
+                writers_without_readers[endpoint.topic_name] = list()
+            writers_without_readers[endpoint.topic_name].append(participant_name)
+        if endpoint.kind == "reader" and topic_counts["writer"]["num"] == 0:
+            if not endpoint.topic_name in readers_without_writers:
+                readers_without_writers[endpoint.topic_name] = list()
+            readers_without_writers[endpoint.topic_name].append(participant_name)
                 
     # Check for Topics with reliable writers but only best effort readers
     topics_with_reliable_writers_but_only_best_effort_readers = []
@@ -401,183 +367,248 @@ def export_analysis(wb, domain, devices_table, types_table, topics_table, topic_
                     topics_with_multiple_types[sorted_endpoints[i].topic_name] = set()
                     topics_with_multiple_types[sorted_endpoints[i].topic_name].add(sorted_endpoints[i].type_name)
                 topics_with_multiple_types[sorted_endpoints[i].topic_name].add(sorted_endpoints[i+1].type_name)
-                
-                
-    ws.append([f"Devices Count: {len(devices_table)}"])
-    ws.append([f"Participants Count: {len(participants)}"])
-    ws.append([f"Types Count: {len(types_table)}"])
+
+    return (writers_without_readers, readers_without_writers,
+            topics_with_reliable_writers_but_only_best_effort_readers, topics_with_multiple_types)
+
+
+# Rows of the Analysis sheet as (row, bold) pairs, bold makes the first cell of the row bold
+def analysis_rows(domain, devices_table, types_table, topics_table, issues):
+
+    participants = domain.participants
+    endpoints = domain.endpoints
+    (writers_without_readers, readers_without_writers,
+     topics_with_reliable_writers_but_only_best_effort_readers, topics_with_multiple_types) = issues
+
+    yield [f"Devices Count: {len(devices_table)}"], False
+    yield [f"Participants Count: {len(participants)}"], False
+    yield [f"Types Count: {len(types_table)}"], False
     unique_topic_names = {
         endpoint.topic_name for endpoint in endpoints if endpoint.topic_name
     }
-    ws.append([f"Topics Count: {len(unique_topic_names)}"])
+    yield [f"Topics Count: {len(unique_topic_names)}"], False
     count = sum(endpoint.kind == "reader" for endpoint in endpoints)
-    ws.append([f"Readers Count: {count}"])
+    yield [f"Readers Count: {count}"], False
     count = sum(endpoint.kind == "writer" for endpoint in endpoints)
-    ws.append([f"Writers Count: {count}"])
-    ws.append([])  
-    ws.append([f"DataWriters without DataReaders: {len(writers_without_readers)}"])
-    ws.append([])   
-    ws.append([f"DataReaders without DataWriters: {len(readers_without_writers)}"])
-    ws.append([])
-    ws.append([f"Topics with reliable writers but only best effort readers: {len(topics_with_reliable_writers_but_only_best_effort_readers)}"])    
-    ws.append([])
-    ws.append([f"Topics with more than one data type: {len(topics_with_multiple_types)}"])
+    yield [f"Writers Count: {count}"], False
+    yield [], False  
+    yield [f"DataWriters without DataReaders: {len(writers_without_readers)}"], False
+    yield [], False   
+    yield [f"DataReaders without DataWriters: {len(readers_without_writers)}"], False
+    yield [], False
+    yield [f"Topics with reliable writers but only best effort readers: {len(topics_with_reliable_writers_but_only_best_effort_readers)}"], False    
+    yield [], False
+    yield [f"Topics with more than one data type: {len(topics_with_multiple_types)}"], False
     
         # Print Devices table
-    ws.append([])
-    ws.append([])
-    ws.append(["Devices"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
+    yield [], False
+    yield [], False
+    yield ["Devices"], True
     for device in sorted(devices_table.keys()):
-        ws.append([])
-        ws.append([f"IP: {device}"])
+        yield [], False
+        yield [f"IP: {device}"], False
         for participant in sorted(devices_table[device][1].keys()):
-            ws.append([f"    App: {participant}"])
+            yield [f"    App: {participant}"], False
             for topic in sorted(devices_table[device][1][participant].keys()):
-                ws.append([
+                yield [
                     f'        {topic}', f'{devices_table[device][1][participant][topic]["writer"]} writers', f'{devices_table[device][1][participant][topic]["reader"]} readers'
-                ])
+                ], False
 
     # Print Topics table
-    ws.append([])
-    ws.append([])
-    ws.append(["Topics"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
+    yield [], False
+    yield [], False
+    yield ["Topics"], True
     for topic in sorted(topics_table.keys()):
-        ws.append([f'    {topic}',
-                    f'devices: {len(topics_table[topic]["devices"])}',
-                    f'participants: {len(topics_table[topic]["participants"])}',
-                    f'writer: {topics_table[topic]["writer"]["num"]}',
-                    f'{topics_table[topic]["writer"]["reliable"]}',
-                    f'reader: {topics_table[topic]["reader"]["num"]}', 
-                    f'{topics_table[topic]["reader"]["reliable"]}',
-                    f'multicast - {topics_table[topic]["reader"]["multicast"]}',
-                    f'content-filters - {topics_table[topic]["reader"]["content-filters"]}'
-        ])
+        yield [f'    {topic}',
+               f'devices: {len(topics_table[topic]["devices"])}',
+               f'participants: {len(topics_table[topic]["participants"])}',
+               f'writer: {topics_table[topic]["writer"]["num"]}',
+               f'{topics_table[topic]["writer"]["reliable"]}',
+               f'reader: {topics_table[topic]["reader"]["num"]}', 
+               f'{topics_table[topic]["reader"]["reliable"]}',
+               f'multicast - {topics_table[topic]["reader"]["multicast"]}',
+               f'content-filters - {topics_table[topic]["reader"]["content-filters"]}'
+               ], False
 
 
     # print out the topics with writers but no readers and readers but no writers
-    ws.append([])
-    ws.append([])
-    ws.append([f"DataWriters without DataReaders - {len(writers_without_readers)}"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
-    ws.append([])
+    yield [], False
+    yield [], False
+    yield [f"DataWriters without DataReaders - {len(writers_without_readers)}"], True
+    yield [], False
     for topic_name in sorted(writers_without_readers.keys()):
         for path in sorted(writers_without_readers[topic_name]):
-            ws.append([f"{topic_name} - {path}"])
+            yield [f"{topic_name} - {path}"], False
 
-    ws.append([])
-    ws.append([])
-    ws.append([f"DataReaders without DataWriters - {len(readers_without_writers)}"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
-    ws.append([])
+    yield [], False
+    yield [], False
+    yield [f"DataReaders without DataWriters - {len(readers_without_writers)}"], True
+    yield [], False
     for topic_name in sorted(readers_without_writers.keys()):
         for path in sorted(readers_without_writers[topic_name]):
-            ws.append([f"{topic_name} - {path}"])
+            yield [f"{topic_name} - {path}"], False
 
     # print out the topics with reliable writers but only best effort readers
-    ws.append([])
-    ws.append([])
-    ws.append([f"Topics with reliable writers but only best effort readers - {len(topics_with_reliable_writers_but_only_best_effort_readers)}"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
-    ws.append([])
+    yield [], False
+    yield [], False
+    yield [f"Topics with reliable writers but only best effort readers - {len(topics_with_reliable_writers_but_only_best_effort_readers)}"], True
+    yield [], False
 
     for topic in sorted(topics_with_reliable_writers_but_only_best_effort_readers):
-        ws.append([topic])
+        yield [topic], False
     
     # print out the topics with multiple types    
-    ws.append([])
-    ws.append([])
-    ws.append([f"Topics with more than one data type - {len(topics_with_multiple_types)}"])
-    ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
-    ws.append([])
+    yield [], False
+    yield [], False
+    yield [f"Topics with more than one data type - {len(topics_with_multiple_types)}"], True
+    yield [], False
     
     # print the topics with multiple types and the types
     for topic in sorted(topics_with_multiple_types.keys()):
-        ws.append([f"{topic}"])
-        ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
-        for type_name in topics_with_multiple_types[topic]:            
-            ws.append([f"    {type_name}"])
-            
-        
+        yield [f"{topic}"], True
+        # endpoints without a type name have None, sort it last
+        for type_name in sorted(topics_with_multiple_types[topic], key=lambda t: (t is None, t or "")):
+            yield [f"    {type_name}"], False
+
+
+def export_analysis(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, topic_besteffort_writers,
+                    topic_reliable_readers, topic_besteffort_readers):
+    ws = wb.active
+    ws.title = "Analysis"
+
+    issues = find_issues(domain.endpoints, topics_table, topic_reliable_writers, topic_reliable_readers, topic_besteffort_readers)
+    for row, bold in analysis_rows(domain, devices_table, types_table, topics_table, issues):
+        ws.append(row)
+        if bold:
+            ws.cell(row=ws.max_row, column=1).font = Font(bold=True)
+
     # Bold the headers (actually any cell with a colon in it)
     for row in ws.iter_rows():
         for cell in row:
-            if ":" in str(cell.value) and not "::" in str(cell.value):
+            if is_label(cell.value):
                 cell.font = Font(bold=True)
     adjust_column_widths(ws)
-    
 
-def ProcessFile(filename):
-    global domains
 
-    tree = ET.parse(filename)
-    root = tree.getroot()
+# Same sheets as the export_* functions above, written to a write-only workbook
+def stream_domain(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, topic_besteffort_writers,
+                  topic_reliable_readers, topic_besteffort_readers):
+    # Analysis is the first sheet like in the normal workbook, it is filled last
+    analysis = StreamingSheet(wb, "Analysis", bold_labels=True)
+
+    print("\nEXPORTING DEVICES")
+    StreamingSheet(wb, "Devices", DEVICES_HEADER, "DevicesTable").write(
+        lambda: ((row, False) for row in devices_rows(devices_table)))
+
+    print("\nEXPORTING PARTICIPANTS")
+    StreamingSheet(wb, "Participants", PARTICIPANTS_HEADER, "ParticipantsTable").write(
+        lambda: ((row, False) for row in participants_rows(domain.participants)))
+
+    print("\nEXPORTING ENTITIES")
+    StreamingSheet(wb, "Endpoints", ENDPOINTS_HEADER, "EndpointsTable").write(
+        lambda: ((row, False) for row in entities_rows(domain.endpoints, types_table)))
+
+    print("\nEXPORTING TOPICS")
+    StreamingSheet(wb, "Topics", TOPICS_HEADER, "TopicsTable").write(
+        lambda: ((row, False) for row in topics_rows(types_table, topics_table)))
+
+    issues = find_issues(domain.endpoints, topics_table, topic_reliable_writers, topic_reliable_readers, topic_besteffort_readers)
+    analysis.write(lambda: analysis_rows(domain, devices_table, types_table, topics_table, issues))
     
-    domain_participants = root.findall(".//domain_participants/value/element")
 
-    for domain_participant in domain_participants:
-        
-        domain_id = domain_participant.find("domain_id").text
-        
-        domain = domains.get(domain_id)
-        if domain is None:
-            domain = Domain(domain_id)
-            domains[domain_id] = domain
+def ProcessFile(filename, stream=False, cache=None, parse_jobs=1):
+    domains.update(parse_domains(filename, stream, cache, parse_jobs))
+    
+
+# Save a workbook so that the same content always gives the same bytes: the document
+# properties and the zip entries are stamped with the given timestamp instead of "now"
+def save_workbook(wb, path, timestamp):
+    wb.properties.created = timestamp
+    wb.properties.modified = timestamp
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        ExcelWriter(wb, archive).save()
+
+    date_time = max(timestamp, datetime.datetime(1980, 1, 1)).timetuple()[:6]
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for info in source.infolist():
+            archive.writestr(zipfile.ZipInfo(info.filename, date_time), source.read(info.filename),
+                             compress_type=zipfile.ZIP_DEFLATED)
+
+
+# Build and save the workbook of one domain. Runs in a worker process with --jobs, so it
+# only gets the parsed domain and returns the saved file name. constant_memory writes
+# the sheets row by row to a write-only workbook instead of keeping every cell.
+def export_domain(domain, basename, timestamp, constant_memory=False):
+    devices_table = {}
+    types_table = {}
+    topics_table = {}
+    topic_reliable_writers = {}
+    topic_besteffort_writers = {}
+    topic_reliable_readers = {}
+    topic_besteffort_readers = {}
+    
+    #process the domain data to create different tables of info
+    extract_tables(domain, devices_table, types_table, topics_table, 
+                   topic_reliable_writers, topic_besteffort_writers, 
+                   topic_reliable_readers, topic_besteffort_readers)  
+    
+    # create spreadsheet and populate worksheets
+    if constant_memory:
+        wb = openpyxl.Workbook(write_only=True)
+        stream_domain(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, 
+                      topic_besteffort_writers, topic_reliable_readers, topic_besteffort_readers)
+    else:
+        wb = openpyxl.Workbook()
             
-        participant_data = domain_participant.find("participant_data")
-        participant = parse_participant(participant_data)
-        
-        domain.participants.append(participant)
+        export_devices(wb, devices_table)
+        export_participants(wb, domain.participants)
         
-        publications = domain_participant.findall(".//publication_data")
-        for publication_data in publications:
-            publication = parse_endpoint(publication_data, "writer", participant)
-            domain.endpoints.append(publication)
-            
-        subscriptions = domain_participant.findall(".//subscription_data")
-        for subscription_data in subscriptions:
-            subscription = parse_endpoint(subscription_data, "reader", participant)
-            domain.endpoints.append(subscription)
-    
+        export_entities(wb, domain.endpoints, types_table, topics_table)
+        export_topics(wb, types_table, topics_table)
+        export_analysis(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, 
+                        topic_besteffort_writers, topic_reliable_readers, topic_besteffort_readers)
     
+    path = basename + "_domain_" + domain.domain_id + ".xlsx"
+    save_workbook(wb, path, timestamp)
+    return path
+
+
+# One workbook per domain, named after the export file
+def export_workbooks(domains, filename, jobs=1, constant_memory=False):
+    basename, _, extension = filename.rpartition(".")
+
+    # Workbooks are stamped with the export's modification time so serial and parallel runs
+    # (and reruns on the same export) produce identical files
+    timestamp = None
+    if domains:
+        timestamp = datetime.datetime.fromtimestamp(int(os.path.getmtime(filename)), datetime.timezone.utc).replace(tzinfo=None)
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(export_domain, domain, basename, timestamp, constant_memory) for domain in domains.values()]
+            for future in futures:
+                print(f"File saved as {future.result()}")
+    else:
+        for domain in domains.values():
+            print(f"File saved as {export_domain(domain, basename, timestamp, constant_memory)}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process a file.")
     parser.add_argument("filename", help="Path to the file")
+    parser.add_argument("--stream", action="store_true", help="Stream the file with iterparse instead of loading the whole XML tree (for very large exports)")
+    parser.add_argument("--constant-memory", action="store_true", help="Write the workbooks row by row (openpyxl write-only mode) instead of keeping every cell in memory")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes building the per-domain workbooks (default: 1, serial)")
+    parser.add_argument("--parse-jobs", type=int, default=1, help="Number of worker processes parsing shards of the file (default: 1, serial)")
+    add_cache_arguments(parser)
     args = parser.parse_args()
     filename = args.filename
    
     try:
-        ProcessFile(filename)
+        ProcessFile(filename, args.stream, cache_from_args(args), args.parse_jobs)
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
 
-    for domain in domains.values():
-        devices_table = {}
-        types_table = {}
-        topics_table = {}
-        topic_reliable_writers = {}
-        topic_besteffort_writers = {}
-        topic_reliable_readers = {}
-        topic_besteffort_readers = {}
-        
-        #process the domain data to create different tables of info
-        extract_tables(domain, devices_table, types_table, topics_table, 
-                       topic_reliable_writers, topic_besteffort_writers, 
-                       topic_reliable_readers, topic_besteffort_readers)  
-        
-        # create spreadsheet and populate worksheets
-        basename, _, extension = filename.rpartition(".")
-        wb = openpyxl.Workbook()
-            
-        export_devices(wb, devices_table)
-        export_participants(wb, domain.participants)
-        
-        export_entities(wb, domain.endpoints, types_table, topics_table)
-        export_topics(wb, types_table, topics_table)
-        export_analysis(wb, domain, devices_table, types_table, topics_table, topic_reliable_writers, 
-                        topic_besteffort_writers, topic_reliable_readers, topic_besteffort_readers)
-        
-        wb.save(basename + "_domain_" + domain.domain_id + ".xlsx")
-        print(f"File saved as {basename}_domain_{domain.domain_id}.xlsx")
+    export_workbooks(domains, filename, args.jobs, args.constant_memory)
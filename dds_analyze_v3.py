@@ -1,166 +1,134 @@
 import argparse
-import xml.etree.ElementTree as ET
 import pandas as pd
+from dds_parse import parse_domains, add_cache_arguments, cache_from_args
 
 
+PARTICIPANT_COLUMNS = ['domain_id', 'name', 'key', 'device_ip', 'device_name', 'path']
 
-def parse_participant(participant_data, domain_id):
-
-    participant_name = None
-    participant_key = None
-    property_name = None
-    property_value = None
-    hostname = None
-    filepath = None
-
-    for child in participant_data:
-
-        if child.tag == "key":
-            participant_key = child.find("value").text
-
-        if child.tag == "participant_name":
-            if child.find("name") is not None:
-                participant_name = child.find("name").text
-
-        if child.tag == "property":
-            for element in child.iter("element"):
-                if element.find("name") is not None:
-                    property_name = element.find("name").text
-
-                if element.find("value") is not None:
-                    property_value = element.find("value").text
-
-                if property_name == "dds.sys_info.hostname":
-                    hostname = property_value
-
-                if property_name == "dds.sys_info.executable_filepath":
-                    filepath = property_value
-
-            if child.find("name") is not None:
-                participant_name = child.find("name").text
-
-        if child.tag == "default_unicast_locators":
-            for element in child.iter("element"):
-                if element.find("address") is not None:
-                    address = element.find("address").text
-                    ip_list = address.split(",")
-                    last_4_ip_list = ip_list[-4:]
-
-                if element.find("kind") is not None:
-                    kind = element.find("kind").text
-                    # If UDP Locator
-                    if kind == "1":
-                        ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
-                        ip_str = ".".join(map(str, ip_bytes))
-                        break
-
-    participant = [domain_id, participant_name, participant_key, ip_str, hostname, filepath]
-
-    return participant
-
-
-def parse_endpoint(data_element, kind, participant_key, domain_id):
-
-    topic_name = None
-    type_name = None
-    reliable = None
-    deadline = None
-    content_filter = None
-    multicast = None
-    multicast_ip_str = None
-    max_sample_serialized_size = ""
-    
-    for child in data_element:
-        if child.tag == "topic_name":
-            topic_name = child.text
-        elif child.tag == "type_name":
-            type_name = child.text
-        elif child.tag == "max_sample_serialized_size":
-            max_sample_serialized_size = child.text
-        elif child.tag == "reliability":
-            reliable = child.find("kind").text
-        elif child.tag == "deadline":
-            sec = child.find("period/sec").text
-            nanosec = child.find("period/nanosec").text
-            if (sec == "DURATION_INFINITE_SEC" or nanosec == "DURATION_INFINITE_NSEC"):
-                deadline = ""
+ENDPOINT_COLUMNS = ['domain_id', 'kind', 'topic_name', 'type_name', 'participant_key', 'reliable',
+                    'max_sample_serialized_size', 'deadline', 'content_filter', 'multicast_ip_str']
+
+# Compact dtypes applied once the endpoints frame is built. The repeated strings become
+# categoricals (the rules rely on this), the sizes/deadlines numbers ("" becomes NA)
+ENDPOINT_DTYPES = {'kind': 'category', 'reliable': 'category', 'topic_name': 'category', 'type_name': 'category',
+                   'max_sample_serialized_size': 'Int64', 'deadline': 'float64'}
+
+
+# Collects rows column by column so the DataFrame is built once at the end of parsing
+# instead of being reallocated for every appended row
+class ColumnBuffer:
+    def __init__(self, columns, dtypes=None):
+        self.columns = columns
+        self.dtypes = dtypes or {}
+        self.data = [[] for _ in columns]
+
+    def append(self, row):
+        for column, value in zip(self.data, row):
+            column.append(value)
+
+    def to_frame(self):
+        df = pd.DataFrame(dict(zip(self.columns, self.data)), columns=self.columns)
+        for column, dtype in self.dtypes.items():
+            if dtype == 'category':
+                df[column] = df[column].astype('category')
             else:
-                deadline = int(sec) + int(nanosec) / 1000000000
-        elif child.tag == "content_filter_property":
-            if child.find("filter_expression") is not None:
-                content_filter = child.find("filter_expression").text
-        elif child.tag == "multicast_locators":
-            for element in child.iter("element"):
-                if element.find("address") is not None:
-                    multicast = element.find("address").text
-                    ip_list = multicast.split(",")
-                    last_4_ip_list = ip_list[-4:]
-                    ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
-                    multicast_ip_str = ".".join(map(str, ip_bytes))
-
-    endpoint = [domain_id, kind, topic_name, type_name, participant_key, reliable, max_sample_serialized_size, deadline, content_filter, multicast_ip_str]
-
-    return endpoint
-        
-
-def test_excess_endpoints(endpoints_df, domain_id):
-
-  # Split up by readers/writers
-  group_by_kind = {name: group for name, group in endpoints_df.groupby('kind')}
-
-  writers_no_readers = group_by_kind["writer"].merge(group_by_kind["reader"], how='outer', on='topic_name', indicator='ind').query(
-      'ind == "left_only"')
-  writers_no_readers.to_csv(f"./writers_no_readers_{domain_id}.csv")
-
-  readers_no_writers = group_by_kind["reader"].merge(group_by_kind["writer"], how='outer', on='topic_name', indicator='ind').query(
-      'ind == "left_only"')
-  
-  readers_no_writers.to_csv(f"./readers_no_writers_domain_{domain_id}.csv")
+                df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        return df
 
 
-def test_inconsistent_type_names(endpoints_df, domain_id):
+# Rules
+#
+# Every check is a rule over one row per topic. aggregate_topics builds those rows with a
+# single grouped aggregation over the endpoints, each rule turns them into one boolean
+# column (True = the topic is flagged), and the endpoints of the flagged topics are
+# exported to the rule's csv file. New checks just register another rule.
 
-  inconsistent_types_list = []
-  for name, group in endpoints_df.groupby('topic_name'):
-      if len(group['type_name'].unique()) != 1:
-          inconsistent_types_list.append(group)
-  
-  inconsistent_types_df = pd.concat(inconsistent_types_list, ignore_index=True)
-  inconsistent_types_df.to_csv(f"./inconsistent_types_domain_{domain_id}.csv")
+RULES = {}
 
 
-def test_potential_multicast_readers(endpoints_df, domain_id):
+class Rule:
+  def __init__(self, name, check, filename, kind=None):
+    self.name = name
+    self.check = check
+    self.filename = filename
+    # only export endpoints of this kind for flagged topics ("writer"/"reader"), None for all
+    self.kind = kind
 
-  multicast_readers_list  = []
 
-  for name, group in endpoints_df.groupby(['topic_name', 'kind']):
-      if name[1] == "reader":
-        if group["content_filter"].isnull().all():
-            if len(group) > 2:
-              multicast_readers_list.append(group)
+def rule(name, filename, kind=None):
+  def register(check):
+    RULES[name] = Rule(name, check, filename, kind)
+    return check
+  return register
 
-  multicast_readers_df = pd.concat(multicast_readers_list, ignore_index=True)
-  multicast_readers_df.to_csv(f"./potential_multicast_readers_domain_{domain_id}.csv")
 
+def aggregate_topics(endpoints_df):
 
-def test_reliable_writer_besteffort_readers(endpoints_df, domain_id):
+  is_writer = endpoints_df['kind'] == 'writer'
+  is_reader = endpoints_df['kind'] == 'reader'
+
+  columns = pd.DataFrame({
+      'topic_name': endpoints_df['topic_name'],
+      'writers': is_writer,
+      'readers': is_reader,
+      'reliable_writers': is_writer & (endpoints_df['reliable'] == 'RELIABLE_RELIABILITY_QOS'),
+      'besteffort_readers': is_reader & (endpoints_df['reliable'] == 'BEST_EFFORT_RELIABILITY_QOS'),
+      'filtered_readers': is_reader & endpoints_df['content_filter'].notna(),
+      # category codes so a missing type name (-1) still counts as one of the names
+      'type_code': endpoints_df['type_name'].cat.codes,
+  })
+
+  return columns.groupby('topic_name', observed=True).agg(
+      writers=('writers', 'sum'),
+      readers=('readers', 'sum'),
+      reliable_writers=('reliable_writers', 'sum'),
+      besteffort_readers=('besteffort_readers', 'sum'),
+      filtered_readers=('filtered_readers', 'sum'),
+      type_names=('type_code', 'nunique'),
+  )
+
+
+@rule("writers_no_readers", "writers_no_readers_{domain_id}.csv", kind="writer")
+def test_writers_no_readers(topics):
+  return (topics['writers'] > 0) & (topics['readers'] == 0)
 
-  mismatch_reliable_list = []
-  for name, group in endpoints_df.groupby(['topic_name']):
-  
-    found = False
-    # if name[1] == "reader":
-    for index, row in group.iterrows():
-      if row["reliable"] == "RELIABLE_RELIABILITY_QOS" and row["kind"] == "writer":
-        found = True
-      
-      if row["reliable"] == "BEST_EFFORT_RELIABILITY_QOS" and row["kind"] == "reader":
-        if found:
-          # print("Reliability mismatch")
-          mismatch_reliable_list.append(group)
 
-  mismatch_reliable_df = pd.concat(mismatch_reliable_list, ignore_index=True)
-  mismatch_reliable_df.to_csv(f"./mismatch_reliable_domain_{domain_id}.csv")
+@rule("readers_no_writers", "readers_no_writers_domain_{domain_id}.csv", kind="reader")
+def test_readers_no_writers(topics):
+  return (topics['readers'] > 0) & (topics['writers'] == 0)
+
+
+@rule("inconsistent_types", "inconsistent_types_domain_{domain_id}.csv")
+def test_inconsistent_type_names(topics):
+  return topics['type_names'] != 1
+
+
+@rule("potential_multicast_readers", "potential_multicast_readers_domain_{domain_id}.csv", kind="reader")
+def test_potential_multicast_readers(topics):
+  return (topics['readers'] > 2) & (topics['filtered_readers'] == 0)
+
+
+@rule("mismatch_reliable", "mismatch_reliable_domain_{domain_id}.csv")
+def test_reliable_writer_besteffort_readers(topics):
+  return (topics['reliable_writers'] > 0) & (topics['besteffort_readers'] > 0)
+
+
+# One boolean column per rule, indexed by topic name
+def evaluate_rules(endpoints_df, rules=None):
+  rules = RULES if rules is None else rules
+  topics = aggregate_topics(endpoints_df)
+  return pd.DataFrame({name: r.check(topics).astype(bool) for name, r in rules.items()}, index=topics.index)
+
+
+def export_rule_results(endpoints_df, results, domain_id, rules=None):
+  rules = RULES if rules is None else rules
+  for name, r in rules.items():
+    flagged = results.index[results[name]]
+    rows = endpoints_df[endpoints_df['topic_name'].isin(flagged)]
+    if r.kind is not None:
+      rows = rows[rows['kind'] == r.kind]
+    rows = rows.sort_values('topic_name', kind='stable').reset_index(drop=True)
+    rows.to_csv(f"./{r.filename.format(domain_id=domain_id)}")
 
 
 def get_devices(participants_df, devices_df):
@@ -176,54 +144,40 @@ def get_devices(participants_df, devices_df):
   devices_df.to_csv("./all_devices.csv")
   
 
-def ProcessFile(filename, participants_df, endpoints_df):
-
-    # Set up Parser
-    tree = ET.parse(filename)
-    root = tree.getroot()
+# participants_df and endpoints_df from the parsed domains, with the rows in the order
+# they appear in the export
+def frames_from_domains(domains):
 
-    # Domain Participants
-    domain_participants = root.findall(".//domain_participants/value/element")
+    participants = ColumnBuffer(PARTICIPANT_COLUMNS)
+    endpoints = ColumnBuffer(ENDPOINT_COLUMNS, ENDPOINT_DTYPES)
 
-    for domain_participant in domain_participants:
-        
-        domain_id = domain_participant.find("domain_id").text
-            
-        participant_data = domain_participant.find("participant_data")
-        participant = parse_participant(participant_data, domain_id)
+    domain_participants = sorted(((participant.index, domain.domain_id, participant)
+                                  for domain in domains.values() for participant in domain.participants),
+                                 key=lambda item: item[0])
+    for index, domain_id, participant in domain_participants:
+        participants.append([domain_id, participant.name, participant.key, participant.device.ip, participant.device.name, participant.path])
 
-        participants_df.loc[len(participants_df)] = participant
-        
-        publications = domain_participant.findall(".//publication_data")
-        for publication_data in publications:
-            publication = parse_endpoint(publication_data, "writer", participant[1], domain_id)
-            endpoints_df.loc[len(endpoints_df)] = publication
-    
-        subscriptions = domain_participant.findall(".//subscription_data")
-        for subscription_data in subscriptions:
-            subscription = parse_endpoint(subscription_data, "reader", participant[1], domain_id)
-            endpoints_df.loc[len(endpoints_df)] = subscription
+    # each participant's writers come before its readers, sorting is stable so they stay that way
+    domain_endpoints = sorted(((endpoint.participant.index, domain.domain_id, endpoint)
+                               for domain in domains.values() for endpoint in domain.endpoints),
+                              key=lambda item: item[0])
+    for index, domain_id, endpoint in domain_endpoints:
+        # participant_key has always held the participant name
+        endpoints.append([domain_id, endpoint.kind, endpoint.topic_name, endpoint.type_name, endpoint.participant.name, endpoint.reliable,
+                          endpoint.max_sample_serialized_size, endpoint.deadline, endpoint.filter, endpoint.multicast])
 
+    return participants.to_frame(), endpoints.to_frame()
 
-  
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process a file.")
-    parser.add_argument("filename", help="Path to the file")
-    args = parser.parse_args()
-    filename = args.filename
 
-    # Set up Data Frames
-    devices_df = pd.DataFrame(columns=['device_ip', 'device_name'])
+def ProcessFile(filename, stream=False, cache=None, parse_jobs=1):
+    return frames_from_domains(parse_domains(filename, stream, cache, parse_jobs))
 
-    participants_df = pd.DataFrame(columns=['domain_id', 'name', 'key', 'device_ip', 'device_name', 'path'])
 
-    endpoints_df = pd.DataFrame(columns=['domain_id', 'kind', 'topic_name', 'type_name', 'participant_key', 'reliable',
-                                      'max_sample_serialized_size', 'deadline', 'content_filter', 'multicast_ip_str'])
+# The csv files: devices, participants per domain and the rule results per domain
+def export_csvs(participants_df, endpoints_df):
 
-    try:
-      ProcessFile(filename, participants_df, endpoints_df)
-    except FileNotFoundError:
-      print(f"Error: File '{filename}' not found.")
+    # Set up Data Frames
+    devices_df = pd.DataFrame(columns=['device_ip', 'device_name'])
 
     # Get Devices
     get_devices(participants_df, devices_df)
@@ -234,13 +188,27 @@ if __name__ == "__main__":
 
     # Run Tests
     for name, group in endpoints_df.groupby('domain_id'):
-      test_excess_endpoints(group, name)
-      test_inconsistent_type_names(group, name)
-      test_potential_multicast_readers(group, name)
-      test_reliable_writer_besteffort_readers(group, name)
+      results = evaluate_rules(group)
+      export_rule_results(group, results, name)
 
     print(f"Participants QTY: {len(participants_df)}")
     print(f"Endpoints QTY: {len(endpoints_df)}")
 
 
+  
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process a file.")
+    parser.add_argument("filename", help="Path to the file")
+    parser.add_argument("--stream", action="store_true", help="Stream the file with iterparse instead of loading the whole XML tree (for very large exports)")
+    parser.add_argument("--parse-jobs", type=int, default=1, help="Number of worker processes parsing shards of the file (default: 1, serial)")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    filename = args.filename
+
+    try:
+      participants_df, endpoints_df = ProcessFile(filename, args.stream, cache_from_args(args), args.parse_jobs)
+    except FileNotFoundError:
+      print(f"Error: File '{filename}' not found.")
+      participants_df, endpoints_df = frames_from_domains({})
 
+    export_csvs(participants_df, endpoints_df)
@@ -0,0 +1,203 @@
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import openpyxl
+import dds_analyze
+import dds_analyze_v3
+from dds_parse import parse_domains
+from dds_generate_export import add_generator_arguments, generator_from_args
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+GENERATOR_OPTIONS = ["domains", "endpoints_per_participant", "topics", "multicast_ratio", "filter_ratio",
+                     "type_mismatch_rate", "reliability_mismatch_rate", "orphan_rate", "seed"]
+
+
+# Peak resident memory of this process so far, in MB (None where resource isn't available)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# Wall time and peak RSS of each stage. A stage run several times (once per domain) adds
+# up its time. The peak RSS can't be reset within a process, so every size runs in its
+# own process and peak_rss_mb is the process peak at the end of the stage; rss_growth_mb
+# is how much that peak grew during the stage.
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+        wall = time.perf_counter() - start
+        rss_after = peak_rss_mb()
+
+        result = self.stages.setdefault(name, {"wall_s": 0.0, "peak_rss_mb": None, "rss_growth_mb": None})
+        result["wall_s"] = round(result["wall_s"] + wall, 4)
+        if rss_after is not None:
+            result["peak_rss_mb"] = rss_after
+            result["rss_growth_mb"] = round((result["rss_growth_mb"] or 0) + rss_after - rss_before, 1)
+
+
+# Runs every stage on one export, in the current directory (the workbooks and csv files
+# are written there)
+def measure(filename, stream=False):
+    timer = StageTimer()
+
+    with timer.stage("parse"):
+        domains = parse_domains(filename, stream)
+
+    timestamp = datetime.datetime(2000, 1, 1)
+    for domain in domains.values():
+        tables = [{}, {}, {}, {}, {}, {}, {}]
+        devices_table, types_table, topics_table = tables[:3]
+        with timer.stage("extract_tables"):
+            dds_analyze.extract_tables(domain, *tables)
+
+        wb = openpyxl.Workbook()
+        with timer.stage("export_devices"):
+            dds_analyze.export_devices(wb, devices_table)
+        with timer.stage("export_participants"):
+            dds_analyze.export_participants(wb, domain.participants)
+        with timer.stage("export_entities"):
+            dds_analyze.export_entities(wb, domain.endpoints, types_table, topics_table)
+        with timer.stage("export_topics"):
+            dds_analyze.export_topics(wb, types_table, topics_table)
+        with timer.stage("export_analysis"):
+            dds_analyze.export_analysis(wb, domain, *tables)
+        with timer.stage("save_workbook"):
+            dds_analyze.save_workbook(wb, f"benchmark_domain_{domain.domain_id}.xlsx", timestamp)
+        del wb
+
+    with timer.stage("v3.frames_from_domains"):
+        participants_df, endpoints_df = dds_analyze_v3.frames_from_domains(domains)
+    del domains
+
+    for domain_id, group in endpoints_df.groupby("domain_id"):
+        with timer.stage("v3.aggregate_topics"):
+            topics = dds_analyze_v3.aggregate_topics(group)
+        for name, r in dds_analyze_v3.RULES.items():
+            with timer.stage(f"v3.{r.check.__name__}"):
+                r.check(topics)
+        with timer.stage("v3.export_rule_results"):
+            dds_analyze_v3.export_rule_results(group, dds_analyze_v3.evaluate_rules(group), domain_id)
+
+    return {
+        "participants": len(participants_df),
+        "endpoints": len(endpoints_df),
+        "stages": timer.stages,
+    }
+
+
+# Generates the export for one size and measures it in a fresh process
+def run_size(size, args, workdir, generator):
+    participants = max(1, size // (args.domains * args.endpoints_per_participant))
+    # exports are kept in --workdir and reused by runs with the same generator options
+    options = hashlib.sha256(json.dumps(generator, sort_keys=True).encode()).hexdigest()[:12]
+    filename = os.path.join(workdir, f"export_{size}_{options}.xml")
+    if not os.path.exists(filename):
+        print(f"Generating {filename}")
+        generator_from_args(args, participants=participants).write(filename)
+
+    result_path = os.path.join(workdir, f"result_{size}.json")
+    command = [sys.executable, os.path.abspath(__file__), "--measure", os.path.abspath(filename), "--result", result_path]
+    if args.stream:
+        command.append("--stream")
+    subprocess.run(command, cwd=workdir, check=True)
+
+    with open(result_path) as f:
+        result = json.load(f)
+    result["size"] = size
+    result["export_mb"] = round(os.path.getsize(filename) / (1024 * 1024), 1)
+    return result
+
+
+def print_result(result):
+    print(f"\n{result['endpoints']} endpoints, {result['participants']} participants ({result['export_mb']} MB export)")
+    for name, stage in result["stages"].items():
+        rss = "" if stage["peak_rss_mb"] is None else f"  peak {stage['peak_rss_mb']:9.1f} MB  +{stage['rss_growth_mb']:.1f} MB"
+        print(f"  {name:<45} {stage['wall_s']:10.3f}s{rss}")
+
+
+# Wall time of every stage against a previous results file, for the sizes both have
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r["size"]: r for r in json.load(f)["results"]}
+
+    print(f"\nCompared to {baseline_path} (new / old wall time)")
+    for result in results:
+        old = baseline.get(result["size"])
+        if old is None:
+            continue
+        print(f"\n{result['size']} endpoints")
+        for name, stage in result["stages"].items():
+            if name not in old["stages"]:
+                continue
+            old_wall = old["stages"][name]["wall_s"]
+            ratio = stage["wall_s"] / old_wall if old_wall else float("inf")
+            print(f"  {name:<45} {old_wall:10.3f}s -> {stage['wall_s']:10.3f}s  x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analyzers on synthetic Admin Console exports.")
+    parser.add_argument("sizes", nargs="*", type=int, default=DEFAULT_SIZES, help="Endpoint counts to run (default: 1000 10000 100000 1000000)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Results file (default: benchmark.json)")
+    parser.add_argument("--compare", help="Previous results file to compare the wall times with")
+    parser.add_argument("--workdir", help="Directory for the generated exports and outputs, kept after the run (default: a temporary directory)")
+    parser.add_argument("--stream", action="store_true", help="Parse with iterparse streaming")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    # the worker side: measure one export and write the stages to the result file
+    if args.measure:
+        with open(args.result, "w") as f:
+            json.dump(measure(args.measure, args.stream), f)
+        sys.exit(0)
+
+    generator = {name: getattr(args, name) for name in GENERATOR_OPTIONS}
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(workdir, exist_ok=True)
+
+        results = []
+        for size in args.sizes:
+            results.append(run_size(size, args, workdir, generator))
+            print_result(results[-1])
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stream": args.stream,
+            "generator": generator,
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults saved as {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -1,197 +1,566 @@
 import rti.connextdds as dds
 from rti.connextdds import PublicationBuiltinTopicData, SubscriptionBuiltinTopicData
-import threading
+import argparse
 import time
 import csv
-
-# Global map to store types
+from collections import deque, OrderedDict
+from dds_events import EventLog, DEFAULT_MAX_MB
+from dds_store import Participant, Endpoint, Edge, guid_key, guid_str
+from dds_db import CaptureDB
+from dds_metrics import DiscoveryMetrics, DEFAULT_INTERVAL
+from dds_snapshot import SnapshotWriter, DEFAULT_SNAPSHOT_INTERVAL
+
+# Global map to store types, keyed by 16-byte GUIDs (see dds_store.py)
 entities = {}
 participants = {}
 edges = {}
 
+# (domain_id, topic_name, type_name) -> {"Writer": set of entity keys, "Reader": set of entity keys}
+edge_index = {}
+# participant key -> keys of the entities discovered before their participant
+waiting = {}
+# participant key -> keys of its entities
+participant_entities = {}
+# key -> time last announced or seen alive, oldest first (for --ttl and --max-entities)
+entity_seen = OrderedDict()
+participant_seen = OrderedDict()
+# participant key <-> (domain_id, instance handle in the domain's participant reader), for --ttl
+participant_handles = {}
+handle_participants = {}
+# evicted entities/participants by reason
+evictions = {
+    "entities": {"disposed": 0, "no_writers": 0, "participant_left": 0, "ttl": 0, "retention": 0},
+    "participants": {"disposed": 0, "lease_expired": 0, "ttl": 0},
+}
+# EventLog of the discovery events with --event-log
+event_log = None
+# CaptureDB with --db, written once per drain
+db = None
+# DiscoveryMetrics with --metrics/--metrics-file
+metrics = None
+# key -> discovery time of the endpoints without an edge yet (only kept with metrics)
+unmatched = {}
+# SnapshotWriter with --snapshot-dir
+snapshots = None
+
+# Raw discovery records pushed by the listeners (from the middleware's threads) and applied
+# by the main loop, the only thread touching the maps above. deque appends and pops are
+# atomic so neither side takes a lock. Records start with the time they were queued and
+# the domain of the listener's participant:
+#   (time, domain_id, "participant", key, name, address of the first unicast locator, instance handle)
+#   (time, domain_id, "entity", key, kind, topic_name, type_name, participant key)
+#   (time, domain_id, "participant_gone" / "entity_gone", key, reason)
+# keys are the raw key.value sequences, turned into 16-byte keys by the main loop
+ingest = deque()
+
+# Records applied per drain, the main loop goes on draining without sleeping while the
+# queue is longer than this
+DRAIN_BATCH = 5000
+# Seconds between drains of an empty queue, and between status prints
+DRAIN_INTERVAL = 0.1
+TICK_INTERVAL = 2
+
+
+# Queue depth and drain latency (time from a listener queuing a record to the main loop
+# applying it) since the last status print
+class IngestStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.records = 0
+        self.drains = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __str__(self):
+        average = self.total_latency / self.records * 1000 if self.records else 0.0
+        return (f"depth {len(ingest)} (max {self.max_depth}), {self.records} records in {self.drains} drains, "
+                f"latency avg {average:.1f} ms max {self.max_latency * 1000:.1f} ms")
+
+
+ingest_stats = IngestStats()
+
+
+# Add an entity to edge_index and create only its own edges, with the entities of the
+# other kind on the same topic and type in its domain
+def index_entity(key, entity):
+    match = edge_index.setdefault((entity.domain_id, entity.topic_name, entity.type_name), {"Writer": set(), "Reader": set()})
+    match[entity.kind].add(key)
+
+    if entity.kind == "Writer":
+        new_edges = [(key, r) for r in match["Reader"]]
+    else:
+        new_edges = [(w, key) for w in match["Writer"]]
+    for w, r in new_edges:
+        edges[(w, r)] = Edge(w, r, entity.topic_name)
+        mark_snapshot("edges", (w, r), "added")
+        if db is not None:
+            db.add_edge(w, r, entity.topic_name, entity.domain_id)
+
+    if metrics is not None and new_edges:
+        now = time.monotonic()
+        for matched in [key] + [w if w != key else r for w, r in new_edges]:
+            discovered = unmatched.pop(matched, None)
+            if discovered is not None:
+                metrics.first_match_seconds.observe(now - discovered)
+
+
+# Remove an entity from edge_index along with its edges
+def unindex_entity(key, entity):
+    match_key = (entity.domain_id, entity.topic_name, entity.type_name)
+    match = edge_index.get(match_key)
+    if match is None or key not in match[entity.kind]:
+        return
+    match[entity.kind].discard(key)
+
+    if entity.kind == "Writer":
+        removed = [(key, r) for r in match["Reader"]]
+    else:
+        removed = [(w, key) for w in match["Writer"]]
+    for edge_key in removed:
+        if edges.pop(edge_key, None) is not None:
+            mark_snapshot("edges", edge_key, "removed")
+
+    if not match["Writer"] and not match["Reader"]:
+        del edge_index[match_key]
+
+
+def log_event(event, **fields):
+    if event_log is not None:
+        event_log.append(event, **fields)
+
+
+def mark_snapshot(table, key, change):
+    if snapshots is not None:
+        snapshots.mark(table, key, change)
+
+
+def discard_from(keys_by_participant, p_guid, key):
+    keys = keys_by_participant.get(p_guid)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del keys_by_participant[p_guid]
+
+
+def update_participant(key, name, ip, domain_id):
+    known = participants.get(key)
+    if known is None:
+        print(f"Adding Participant to list: {name} {ip} (domain {domain_id})")
+        if metrics is not None:
+            metrics.discovered.inc("participant")
+    if known is None or known.name != name or known.ip != ip:
+        log_event("participant", key=guid_str(key), name=name, ip=ip, domain_id=domain_id)
+        mark_snapshot("participants", key, "added" if known is None else "changed")
+        if db is not None:
+            db.add_participant(key, name, ip, domain_id)
+    participants[key] = Participant(name, ip, domain_id)
+    participant_seen[key] = time.time()
+    participant_seen.move_to_end(key)
+
+    # Update the readers/writers discovered before their participant, or all of them
+    # when it changed name or ip
+    if known is not None and (known.name != name or known.ip != ip):
+        waiting.pop(key, None)
+        updated = participant_entities.get(key, ())
+    else:
+        updated = waiting.pop(key, ())
+    for entity_key in updated:
+        entities[entity_key].p_ip = ip
+        entities[entity_key].p_name = name
+        mark_snapshot("entities", entity_key, "changed")
+
+
+# Add an entity discovered at the given (monotonic) time and its edges, with its
+# participant's name and ip if the participant is known (otherwise it waits for
+# update_participant)
+def add_entity(key, entity, discovered):
+    print(f"Adding {entity.kind} to list: {entity.topic_name}")
+    if metrics is not None:
+        metrics.discovered.inc("endpoint")
+        unmatched[key] = discovered
+    entities[key] = entity
+    entity_seen[key] = time.time()
+    participant_entities.setdefault(entity.p_guid, set()).add(key)
+    if db is not None:
+        db.add_endpoint(key, entity)
+    index_entity(key, entity)
+    log_event("entity", key=guid_str(key), kind=entity.kind, topic_name=entity.topic_name, type_name=entity.type_name,
+              p_guid=guid_str(entity.p_guid), domain_id=entity.domain_id)
+    mark_snapshot("entities", key, "added")
+
+    participant = participants.get(entity.p_guid)
+    if participant is None:
+        waiting.setdefault(entity.p_guid, set()).add(key)
+    else:
+        entity.p_ip = participant.ip
+        entity.p_name = participant.name
+
+
+def remove_entity(key, reason):
+    entity = entities.pop(key, None)
+    if entity is None:
+        return
+    del entity_seen[key]
+    unmatched.pop(key, None)
+    discard_from(participant_entities, entity.p_guid, key)
+    discard_from(waiting, entity.p_guid, key)
+    unindex_entity(key, entity)
+    evictions["entities"][reason] += 1
+    log_event("remove_entity", key=guid_str(key))
+    mark_snapshot("entities", key, "removed")
+    if db is not None:
+        db.remove_endpoint(key)
+
+
+# Remove a participant and its entities
+def remove_participant(key, reason):
+    if participants.pop(key, None) is None:
+        return
+    del participant_seen[key]
+    handle_participants.pop(participant_handles.pop(key, None), None)
+    evictions["participants"][reason] += 1
+    log_event("remove_participant", key=guid_str(key))
+    mark_snapshot("participants", key, "removed")
+    if db is not None:
+        db.remove_participant(key)
+
+    for entity_key in list(participant_entities.get(key, ())):
+        remove_entity(entity_key, "participant_left")
+
+
+# Mark as seen the participants the middleware still has (their leases are refreshed
+# without any builtin sample, which only comes when they change), by the instance handles
+# their samples came with, so --ttl only evicts what is really gone
+def refresh_seen(domain_participants):
+    now = time.time()
+    for participant in domain_participants:
+        for handle in participant.discovered_participants():
+            key = handle_participants.get((participant.domain_id, handle))
+            if key is not None:
+                participant_seen[key] = now
+                participant_seen.move_to_end(key)
+
+
+# Evict the participants not seen alive within ttl seconds (their entities with them) and
+# the entities still waiting for their participant after ttl seconds, then the oldest
+# entities past max_entities
+def expire(ttl=None, max_entities=None):
+    if ttl:
+        oldest = time.time() - ttl
+        while participant_seen and next(iter(participant_seen.values())) < oldest:
+            remove_participant(next(iter(participant_seen)), "ttl")
+        for entity_key in [k for keys in waiting.values() for k in keys if entity_seen[k] < oldest]:
+            remove_entity(entity_key, "ttl")
+    if max_entities:
+        while len(entities) > max_entities:
+            remove_entity(next(iter(entity_seen)), "retention")
+
+
+def apply_record(record):
+    domain_id = record[1]
+    kind = record[2]
+    if kind == "entity":
+        _, _, _, key_value, entity_kind, topic_name, type_name, p_key_value = record
+        key = guid_key(key_value)
+        if key in entities:
+            entity_seen[key] = time.time()
+            entity_seen.move_to_end(key)
+        else:
+            add_entity(key, Endpoint(topic_name=topic_name, type_name=type_name, kind=entity_kind, p_guid=guid_key(p_key_value),
+                                     domain_id=domain_id), record[0])
+    elif kind == "participant":
+        _, _, _, key_value, name, address, handle = record
+        ip = '.'.join(str(byte) for byte in address[-4:])
+        key = guid_key(key_value)
+        update_participant(key, name, ip, domain_id)
+        participant_handles[key] = (domain_id, handle)
+        handle_participants[(domain_id, handle)] = key
+    elif kind == "entity_gone":
+        remove_entity(guid_key(record[3]), record[4])
+    elif kind == "participant_gone":
+        remove_participant(guid_key(record[3]), record[4])
+
+
+# Apply up to max_records queued records, returns whether records are left
+def drain(max_records=DRAIN_BATCH):
+    depth = len(ingest)
+    ingest_stats.max_depth = max(ingest_stats.max_depth, depth)
+    if not depth:
+        return False
+
+    ingest_stats.drains += 1
+    now = time.monotonic()
+    for _ in range(min(depth, max_records)):
+        record = ingest.popleft()
+        latency = now - record[0]
+        ingest_stats.records += 1
+        ingest_stats.total_latency += latency
+        ingest_stats.max_latency = max(ingest_stats.max_latency, latency)
+        apply_record(record)
+
+    if db is not None:
+        db.commit()
+    return len(ingest) > 0
+
+
+# Why an instance left, None if it is still alive
+def departure_reason(info):
+    if info.state.instance_state == dds.InstanceState.NOT_ALIVE_DISPOSED:
+        return "disposed"
+    if info.state.instance_state == dds.InstanceState.NOT_ALIVE_NO_WRITERS:
+        return "no_writers"
+    return None
+
+
+# The listeners only copy what the main loop needs out of the samples and queue it.
+# Samples of an instance state change (invalid data) only have the instance handle.
+# Each participant (one per domain) has its own listeners, created with its domain id.
+
+# Listener for participant discovery
+class ParticipantListener(dds.ParticipantBuiltinTopicData.DataReaderListener):
+    def __init__(self, domain_id):
+        super(ParticipantListener, self).__init__()
+        self.domain_id = domain_id
 
-class Entity:
-  def __init__(self, id=None, topic_name=None, type_name=None, kind=None, p_ip=None, p_name=None, p_guid=None):
-      self.id = id,
-      self.topic_name = topic_name
-      self.type_name = type_name
-      self.kind = kind
-      self.p_ip = p_ip
-      self.p_name = p_name
-      self.p_guid = p_guid
+    def on_data_available(self, reader):
+        start = time.perf_counter()
+        samples = 0
 
-class Participant:
-    def __init__(self, name=None, ip=None):
-        self.name = name
-        self.ip = ip
+        for data, info in reader.take():
+            samples += 1
+            if info.valid:
+                ingest.append((time.monotonic(), self.domain_id, "participant", data.key.value, data.participant_name.name,
+                               data.default_unicast_locators[0].address, info.instance_handle))
+            else:
+                # a participant whose lease expired has no writers left
+                reason = {"disposed": "disposed", "no_writers": "lease_expired"}.get(departure_reason(info))
+                if reason:
+                    ingest.append((time.monotonic(), self.domain_id, "participant_gone", reader.key_value(info.instance_handle).key.value, reason))
 
-class Edge:
-    def __init__(self, source=None, target=None, topic_name=None):
-        self.source = source
-        self.target = target
-        self.topic_name = topic_name
+        if metrics is not None:
+            metrics.callback("participant", start, samples)
 
 
 # Listener for publication discovery
 class PublicationListener(dds.PublicationBuiltinTopicData.DataReaderListener):
 
-    def __init__(self):
+    def __init__(self, domain_id):
         super(PublicationListener, self).__init__()
+        self.domain_id = domain_id
 
     def on_data_available(self, reader):
+        start = time.perf_counter()
+        samples = 0
 
         for data, info in reader.take():
+            samples += 1
             if info.valid:
-                # print(f"Discovered Writer {data.topic_name}")
-                key_list = data.key.value
-                key_int = int(''.join(map(str, key_list)))
-                # print(f"Writer Key: {key_int}")
-                type_name = data.type_name
-                topic_name = data.topic_name
-
-                p_guid_list = data.participant_key.value
-                p_guid_int = int(''.join(map(str, p_guid_list)))
-
-                writer = Entity(topic_name=topic_name,type_name=type_name, kind="Writer", p_guid=p_guid_int)
+                ingest.append((time.monotonic(), self.domain_id, "entity", data.key.value, "Writer", data.topic_name, data.type_name,
+                               data.participant_key.value))
+            else:
+                reason = departure_reason(info)
+                if reason:
+                    ingest.append((time.monotonic(), self.domain_id, "entity_gone", reader.key_value(info.instance_handle).key.value, reason))
 
-                if key_int not in entities:
-                    print(f"Adding Writer to list: {writer.topic_name}")
-                    entities[key_int] = writer
+        if metrics is not None:
+            metrics.callback("publication", start, samples)
 
 # Listener for subscription discovery
 class SubscriptionListener(dds.SubscriptionBuiltinTopicData.DataReaderListener):
+    def __init__(self, domain_id):
+        super(SubscriptionListener, self).__init__()
+        self.domain_id = domain_id
+
     def on_data_available(self, reader):
+        start = time.perf_counter()
+        samples = 0
 
         for data, info in reader.take():
+            samples += 1
             if info.valid:
-                # print(f"Discovered Reader {data.topic_name}")
-                key_list = data.key.value
-                key_int = int(''.join(map(str, key_list)))
-                # print(f"Reader Key: {key_int}")
-                type_name = data.type_name
-                topic_name = data.topic_name
+                ingest.append((time.monotonic(), self.domain_id, "entity", data.key.value, "Reader", data.topic_name, data.type_name,
+                               data.participant_key.value))
+            else:
+                reason = departure_reason(info)
+                if reason:
+                    ingest.append((time.monotonic(), self.domain_id, "entity_gone", reader.key_value(info.instance_handle).key.value, reason))
+
+        if metrics is not None:
+            metrics.callback("subscription", start, samples)
+
+
+
+
+# Writes entities, participants and edges csv files, only those of domain_id if given
+# (the files are then suffixed with _domain_<id>)
+def export_csvs(domain_id=None):
+    suffix = "" if domain_id is None else f"_domain_{domain_id}"
+
+    def in_domain(record):
+        return domain_id is None or record.domain_id == domain_id
+
+    # Entities
+    print(f"\nEXPORTING Entities{suffix}")
+    en_header = ["id", "topic name", "type name", "kind", "participant ip", "participant name", "participant id", "domain id"]
 
-                p_guid_list = data.participant_key.value
-                p_guid_int = int(''.join(map(str, p_guid_list)))
+    with open(f'entities{suffix}.csv', 'w', newline='') as en_csvfile:
+      en_writer = csv.writer(en_csvfile)
+      en_writer.writerow(en_header)
 
-                reader = Entity(topic_name=topic_name,
-                                type_name=type_name, kind="Reader", p_guid=p_guid_int)
-                
-                if key_int not in entities:
-                    print(f"Adding Reader to list: {reader.topic_name}")
-                    entities[key_int] = reader
-                
+      for e in entities:
+        if in_domain(entities[e]):
+          en_writer.writerow([guid_str(e), entities[e].topic_name, entities[e].type_name, entities[e].kind, entities[e].p_ip, entities[e].p_name, guid_str(entities[e].p_guid), entities[e].domain_id])
 
+    # Participants
+    print(f"\nEXPORTING Participants{suffix}")
+    dp_header = ["id", "name", "ip", "domain id"]
 
+    with open(f'participants{suffix}.csv', 'w', newline='') as dp_csvfile:
+      dp_writer = csv.writer(dp_csvfile)
+      dp_writer.writerow(dp_header)
+
+      for p in participants:
+        if in_domain(participants[p]):
+          dp_writer.writerow([guid_str(p), participants[p].name, participants[p].ip, participants[p].domain_id])
+
+    # Edges
+    print(f"\nEXPORTING Edges{suffix}")
+    ed_header = ["id", "from", "to", "topic"]
+
+    with open(f'edges{suffix}.csv', 'w', newline='') as ed_csvfile:
+      ed_writer = csv.writer(ed_csvfile)
+      ed_writer.writerow(ed_header)
+
+      for x in edges:
+        if in_domain(entities[x[0]]):
+          ed_writer.writerow([(guid_str(x[0]), guid_str(x[1])), guid_str(edges[x].source), guid_str(edges[x].target), edges[x].topic_name])
+
+
+# "1", "0-3" or "0,2,5-7" to a list of domain ids
+def parse_domain_ids(value):
+    domain_ids = []
+    for part in value.split(","):
+        first, _, last = part.partition("-")
+        domain_ids.extend(range(int(first), int(last or first) + 1))
+    return domain_ids
+
+
+def main(args):
+    global event_log, db, metrics, snapshots
 
-def main():
     # Create participant in disabled state
     participant_factory_qos = dds.DomainParticipantFactoryQos()
     participant_factory_qos.entity_factory.autoenable_created_entities = False
     dds.DomainParticipant.participant_factory_qos = participant_factory_qos
 
-    participant = dds.DomainParticipant(domain_id=1)
-
-    # Set listeners for the built-in DataReaders
-    participant.publication_reader.set_listener(PublicationListener(), dds.StatusMask.DATA_AVAILABLE)
-    participant.subscription_reader.set_listener(SubscriptionListener(), dds.StatusMask.DATA_AVAILABLE)
-
-    # Enable participant
-    participant.enable()
-
-    print("Participant Enabled, listening for entities")
+    if args.event_log:
+        event_log = EventLog(args.event_log, args.event_log_max_mb * 1024 * 1024)
+    if args.db:
+        db = CaptureDB(args.db, reset=True)
+    if args.metrics or args.metrics_file:
+        metrics = DiscoveryMetrics(args.metrics_file, args.metrics_interval)
+    if args.snapshot_dir:
+        snapshots = SnapshotWriter(args.snapshot_dir, args.snapshot_interval)
+
+    # One participant per domain, all feeding the same queue
+    domain_participants = []
+    for domain_id in args.domains:
+        participant = dds.DomainParticipant(domain_id=domain_id)
+
+        # Set listeners for the built-in DataReaders
+        participant.participant_reader.set_listener(ParticipantListener(domain_id), dds.StatusMask.DATA_AVAILABLE)
+        participant.publication_reader.set_listener(PublicationListener(domain_id), dds.StatusMask.DATA_AVAILABLE)
+        participant.subscription_reader.set_listener(SubscriptionListener(domain_id), dds.StatusMask.DATA_AVAILABLE)
+        domain_participants.append(participant)
+
+    # Enable participants
+    for participant in domain_participants:
+        participant.enable()
+
+    print(f"Participants Enabled on domains {args.domains}, listening for entities")
     # Keep the application running
 
-
-    
+    next_tick = time.monotonic()
     try:
         while True:
-            
-            # Get current participants
-            p_list = participant.discovered_participants()
-            for p in p_list:
-              data = participant.discovered_participant_data(p)
-              name = data.participant_name.name
-              ip_list = data.default_unicast_locators[0].address[-4:]
-              ip = '.'.join(str(byte) for byte in ip_list)
-
-              participant_info = Participant(name, ip)
-
-              key_list = data.key.value
-              key_int = int(''.join(map(str, key_list)))
-              # print(f"Participant Key: {key_int}")
-              participants[key_int] = participant_info
-              # print(f'Participant Name: {data.participant_name.name}')
-
-            # Downselect Dict for Edge matching
-            readers = {k: v for k, v in entities.items() if v.kind == "Reader"}
-            writers = {k: v for k, v in entities.items() if v.kind == "Writer"}
-
-            for w in writers:
-              # Update writers with Participant info
-              if writers[w].p_guid in participants:
-                entities[w].p_ip = participants[writers[w].p_guid].ip
-                entities[w].p_name = participants[writers[w].p_guid].name
-                
-              # Get Edges
-              for r in readers:
-                if readers[r].topic_name == writers[w].topic_name and readers[r].type_name == writers[w].type_name:
-                  edge_key = (w, r)
-                  # print(edge_key)
-                  new_edge = Edge(w, r, readers[r].topic_name)
-                  edges[edge_key] = new_edge
-
-            for r in readers:
-              # Update readers with Participant info
-              if readers[r].p_guid in participants:
-                entities[r].p_ip = participants[readers[r].p_guid].ip
-                entities[r].p_name = participants[readers[r].p_guid].name
-
-            print(f'Discovered Entities Count: {len(entities)}')
-
-            print(f'Discovered Participants Count: {len(p_list)}')
-            for p in participants:
-              print(f'Name: {participants[p].name}')
-              print(f'IP: {participants[p].ip}')
-
-            time.sleep(2)
+            tick_start = time.perf_counter()
 
+            # Apply the discoveries/removals queued by the listeners
+            pending = drain()
 
-    except KeyboardInterrupt:
-      # Entities
-      print("\nEXPORTING Entities")
-      en_header = ["id", "topic name", "type name", "kind", "participant ip", "participant name", "participant id"]
+            if time.monotonic() >= next_tick:
+              next_tick = time.monotonic() + TICK_INTERVAL
+              if args.ttl:
+                refresh_seen(domain_participants)
+              expire(args.ttl, args.max_entities)
+              if db is not None:
+                db.commit()
+
+              print(f'Discovered Entities Count: {len(entities)}')
 
-      with open('entities.csv', 'w', newline='') as en_csvfile:
-        en_writer = csv.writer(en_csvfile)
-        en_writer.writerow(en_header)
+              print(f'Discovered Participants Count: {len(participants)}')
 
-        for e in entities:
-          en_writer.writerow([e, entities[e].topic_name, entities[e].type_name, entities[e].kind, entities[e].p_ip, entities[e].p_name, entities[e].p_guid])
+              print(f'Evicted Entities: {evictions["entities"]}')
+              print(f'Evicted Participants: {evictions["participants"]}')
 
-      # Participants
-      print("\nEXPORTING Participants")
-      dp_header = ["id", "name", "ip"]
+              print(f'Ingest Queue: {ingest_stats}')
+              ingest_stats.reset()
 
-      with open('participants.csv', 'w', newline='') as dp_csvfile:
-        dp_writer = csv.writer(dp_csvfile)
-        dp_writer.writerow(dp_header)
+              if event_log is not None:
+                event_log.flush()
 
-        for p in participants:
-          dp_writer.writerow([p, participants[p].name, participants[p].ip])
+              if snapshots is not None:
+                generation = snapshots.generation
+                counts = snapshots.write_if_due(participants, entities, edges)
+                if counts is not None:
+                  print(f'Snapshot {generation}: {counts[0]} added, {counts[1]} changed, {counts[2]} removed')
 
-      # Edges
-      print("\nEXPORTING Edges")
-      ed_header = ["id", "from", "to", "topic"]
+            if metrics is not None:
+              metrics.tick_seconds.observe(time.perf_counter() - tick_start)
+              metrics.write_if_due()
 
-      with open('edges.csv', 'w', newline='') as ed_csvfile:
-        ed_writer = csv.writer(ed_csvfile)
-        ed_writer.writerow(ed_header)
+            if not pending:
+              time.sleep(DRAIN_INTERVAL)
 
-        for x in edges:
-          ed_writer.writerow([x, edges[x].source, edges[x].target, edges[x].topic_name])
 
+    except KeyboardInterrupt:
+      while drain():
+        pass
+      if event_log is not None:
+        event_log.close()
+      if db is not None:
+        db.close()
+      if metrics is not None:
+        metrics.write()
+        print(metrics.summary())
+      if snapshots is not None:
+        snapshots.write(participants, entities, edges)
+        snapshots.wait()
+
+      if args.per_domain:
+        for domain_id in args.domains:
+          export_csvs(domain_id)
+      else:
+        export_csvs()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Capture the discovered DDS participants and endpoints.")
+    parser.add_argument("--event-log", help="Directory to append the discovery events to as they happen (see dds_events.py)")
+    parser.add_argument("--event-log-max-mb", type=int, default=DEFAULT_MAX_MB, help=f"Size at which the event log moves to a new file (default: {DEFAULT_MAX_MB})")
+    parser.add_argument("--ttl", type=float, help="Evict participants no longer discovered (lease gone without a dispose) with their entities, and entities whose participant isn't discovered, after this many seconds")
+    parser.add_argument("--max-entities", type=int, help="Keep at most this many entities, the least recently announced are evicted first")
+    parser.add_argument("-d", "--domains", type=parse_domain_ids, default=[1], help="Domain ids to capture, e.g. 1, 0-3 or 0,2,5-7 (default: 1)")
+    parser.add_argument("--db", help="SQLite database to keep up to date with the capture (query it with dds_db.py)")
+    parser.add_argument("--metrics", action="store_true", help="Collect discovery metrics and print a summary at the end")
+    parser.add_argument("--metrics-file", help="Prometheus textfile to write the discovery metrics to (implies --metrics)")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_INTERVAL, help=f"Seconds between writes of the metrics file (default: {DEFAULT_INTERVAL})")
+    parser.add_argument("--snapshot-dir", help="Directory for delta snapshots of the capture (see dds_snapshot.py)")
+    parser.add_argument("--snapshot-interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL, help=f"Seconds between snapshots (default: {DEFAULT_SNAPSHOT_INTERVAL})")
+    parser.add_argument("--per-domain", action="store_true", help="Write one set of csv files per domain instead of combined files")
+    args = parser.parse_args()
+
+    main(args)
\ No newline at end of file
@@ -0,0 +1,142 @@
+import argparse
+import sqlite3
+
+
+# SQLite backend of dds_capture.py (--db) and the queries run on it
+#
+# The capture's changes are queued with the methods below and written by commit(), once
+# per drain of the ingest queue, in a single transaction. The database is in WAL mode so
+# queries can run while the capture writes. GUIDs are stored as 16-byte blobs.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    guid BLOB PRIMARY KEY, name TEXT, ip TEXT, domain_id INTEGER);
+CREATE TABLE IF NOT EXISTS endpoints (
+    guid BLOB PRIMARY KEY, kind TEXT, topic_name TEXT, type_name TEXT, participant_guid BLOB, domain_id INTEGER);
+CREATE TABLE IF NOT EXISTS edges (
+    writer_guid BLOB, reader_guid BLOB, topic_name TEXT, domain_id INTEGER, PRIMARY KEY (writer_guid, reader_guid));
+CREATE INDEX IF NOT EXISTS endpoints_topic ON endpoints (topic_name);
+CREATE INDEX IF NOT EXISTS endpoints_type ON endpoints (type_name);
+CREATE INDEX IF NOT EXISTS endpoints_participant ON endpoints (participant_guid);
+CREATE INDEX IF NOT EXISTS participants_ip ON participants (ip);
+CREATE INDEX IF NOT EXISTS participants_name ON participants (name);
+CREATE INDEX IF NOT EXISTS edges_reader ON edges (reader_guid);
+"""
+
+ADD_PARTICIPANT = "INSERT OR REPLACE INTO participants VALUES (?, ?, ?, ?)"
+REMOVE_PARTICIPANT = "DELETE FROM participants WHERE guid = ?"
+ADD_ENDPOINT = "INSERT OR REPLACE INTO endpoints VALUES (?, ?, ?, ?, ?, ?)"
+REMOVE_ENDPOINT = "DELETE FROM endpoints WHERE guid = ?"
+ADD_EDGE = "INSERT OR REPLACE INTO edges VALUES (?, ?, ?, ?)"
+REMOVE_EDGES = "DELETE FROM edges WHERE writer_guid = ?1 OR reader_guid = ?1"
+
+
+class CaptureDB:
+    # reset empties the tables (a new capture rediscovers everything)
+    def __init__(self, path, reset=False):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        if reset:
+            with self.connection:
+                for table in ["participants", "endpoints", "edges"]:
+                    self.connection.execute(f"DELETE FROM {table}")
+        # (statement, parameters) in the order of the changes
+        self.pending = []
+
+    def add_participant(self, key, name, ip, domain_id=None):
+        self.pending.append((ADD_PARTICIPANT, (key, name, ip, domain_id)))
+
+    def remove_participant(self, key):
+        self.pending.append((REMOVE_PARTICIPANT, (key,)))
+
+    def add_endpoint(self, key, endpoint):
+        self.pending.append((ADD_ENDPOINT, (key, endpoint.kind, endpoint.topic_name, endpoint.type_name,
+                                            endpoint.p_guid, endpoint.domain_id)))
+
+    # removes the endpoint's edges too
+    def remove_endpoint(self, key):
+        self.pending.append((REMOVE_ENDPOINT, (key,)))
+        self.pending.append((REMOVE_EDGES, (key,)))
+
+    def add_edge(self, writer_key, reader_key, topic_name, domain_id=None):
+        self.pending.append((ADD_EDGE, (writer_key, reader_key, topic_name, domain_id)))
+
+    # Writes the queued changes in one transaction, consecutive changes of the same kind
+    # with one executemany
+    def commit(self):
+        if not self.pending:
+            return
+        with self.connection:
+            start = 0
+            for i in range(1, len(self.pending) + 1):
+                if i == len(self.pending) or self.pending[i][0] != self.pending[start][0]:
+                    self.connection.executemany(self.pending[start][0], [params for _, params in self.pending[start:i]])
+                    start = i
+        self.pending = []
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+# Queries, each returns (header, rows)
+
+ENDPOINT_COLUMNS = """lower(hex(e.guid)), e.kind, e.topic_name, e.type_name, p.name, p.ip, e.domain_id
+FROM endpoints e LEFT JOIN participants p ON p.guid = e.participant_guid"""
+ENDPOINT_HEADER = ["id", "kind", "topic name", "type name", "participant name", "participant ip", "domain id"]
+
+QUERIES = {
+    "writers": ("Writers of a topic", "topic",
+                f"SELECT {ENDPOINT_COLUMNS} WHERE e.topic_name = ? AND e.kind = 'Writer'", ENDPOINT_HEADER),
+    "readers": ("Readers of a topic", "topic",
+                f"SELECT {ENDPOINT_COLUMNS} WHERE e.topic_name = ? AND e.kind = 'Reader'", ENDPOINT_HEADER),
+    "type": ("Endpoints using a type", "type",
+             f"SELECT {ENDPOINT_COLUMNS} WHERE e.type_name = ?", ENDPOINT_HEADER),
+    "host": ("Endpoints of the participants on a host (ip)", "ip",
+             f"SELECT {ENDPOINT_COLUMNS} WHERE p.ip = ?", ENDPOINT_HEADER),
+    "participant": ("Endpoints of the participants with a name", "name",
+                    f"SELECT {ENDPOINT_COLUMNS} WHERE p.name = ?", ENDPOINT_HEADER),
+    "topics": ("Topics with their writer/reader/edge counts", None,
+               # the edges are counted in one pass, not once per topic
+               """SELECT e.topic_name, e.domain_id, e.writers, e.readers, coalesce(d.edges, 0)
+                  FROM (SELECT topic_name, domain_id, sum(kind = 'Writer') AS writers, sum(kind = 'Reader') AS readers
+                        FROM endpoints GROUP BY topic_name, domain_id) e
+                  LEFT JOIN (SELECT topic_name, domain_id, count(*) AS edges FROM edges GROUP BY topic_name, domain_id) d
+                  ON d.topic_name = e.topic_name AND d.domain_id IS e.domain_id
+                  ORDER BY e.topic_name""",
+               ["topic name", "domain id", "writers", "readers", "edges"]),
+}
+
+
+def run_query(path, name, argument=None):
+    description, argument_name, sql, header = QUERIES[name]
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute(sql, () if argument_name is None else (argument,)).fetchall()
+    finally:
+        connection.close()
+    return header, rows
+
+
+def print_table(header, rows):
+    widths = [max([len(str(value)) for value in column]) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a dds_capture.py database (dds_capture.py --db).")
+    parser.add_argument("database", help="Path to the database")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    for name, (description, argument_name, sql, header) in QUERIES.items():
+        subparser = subparsers.add_parser(name, help=description)
+        if argument_name is not None:
+            subparser.add_argument(argument_name)
+    args = parser.parse_args()
+
+    argument_name = QUERIES[args.query][1]
+    header, rows = run_query(args.database, args.query, getattr(args, argument_name) if argument_name else None)
+    print_table(header, rows)
+    print(f"({len(rows)} rows)")
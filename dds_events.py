@@ -0,0 +1,181 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+
+
+# Discovery event log of dds_capture.py
+#
+# Every discovery, update and removal is appended as one JSON line to events-NNNNNN.jsonl
+# in the log directory, so a killed capture keeps everything up to the last flush. Lines
+# are buffered and written in batches (every flush_events events and on every flush()
+# call), the file is rotated to the next segment past max_bytes. Events:
+#   {"time": ..., "event": "start"}
+#   {"time": ..., "event": "participant", "key": ..., "name": ..., "ip": ..., "domain_id": ...}
+#   {"time": ..., "event": "entity", "key": ..., "kind": ..., "topic_name": ..., "type_name": ..., "p_guid": ..., "domain_id": ...}
+#   {"time": ..., "event": "remove_participant", "key": ...}
+#   {"time": ..., "event": "remove_entity", "key": ...}
+# Keys are GUIDs in hex (dds_store.guid_str). A "participant" or "entity" event for a known
+# key updates it. Each capture starts with a "start" event: a restarted capture appends to
+# the same directory and starts again from nothing, like its --db. compact() replays the
+# segments into the entities/participants/edges csv files of dds_capture.py, as of the
+# last capture.
+
+DEFAULT_MAX_MB = 64
+DEFAULT_FLUSH_EVENTS = 1000
+
+
+class EventLog:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, flush_events=DEFAULT_FLUSH_EVENTS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_events = flush_events
+        # only used from the capture's main loop, no lock
+        self.buffer = []
+
+        os.makedirs(directory, exist_ok=True)
+        # a restarted capture continues in a new segment after the existing ones
+        existing = segments(directory)
+        self.segment = segment_number(existing[-1]) + 1 if existing else 1
+        self.file = self.open_segment()
+        self.append("start")
+        self.flush()
+
+    def open_segment(self):
+        return open(os.path.join(self.directory, f"events-{self.segment:06d}.jsonl"), "a", encoding="utf-8")
+
+    def append(self, event, **fields):
+        self.buffer.append(json.dumps({"time": round(time.time(), 3), "event": event, **fields}))
+        if len(self.buffer) >= self.flush_events:
+            self.write_buffer()
+
+    def flush(self):
+        self.write_buffer()
+
+    def close(self):
+        self.write_buffer()
+        self.file.close()
+
+    def write_buffer(self):
+        if not self.buffer:
+            return
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        if self.file.tell() >= self.max_bytes:
+            self.file.close()
+            self.segment += 1
+            self.file = self.open_segment()
+
+
+def segments(directory):
+    return sorted(glob.glob(os.path.join(directory, "events-*.jsonl")))
+
+
+def segment_number(path):
+    return int(os.path.basename(path)[len("events-"):-len(".jsonl")])
+
+
+# All events of the log directory in order. A line cut short by a crash (only the last
+# line of a segment can be) is skipped.
+def read_events(directory):
+    for path in segments(directory):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    pass
+
+
+# Replays the events into the current participants, entities and edges, the same dicts
+# dds_capture.py keeps: key -> fields, and (writer key, reader key) -> topic name. Only
+# the events after the last "start" count.
+def replay(events):
+    participants = {}
+    entities = {}
+    edges = {}
+    # (domain_id, topic_name, type_name) -> {"Writer": [keys], "Reader": [keys]}, in discovery order
+    edge_index = {}
+
+    def unindex(key):
+        entity = entities[key]
+        match = edge_index.get((entity["domain_id"], entity["topic_name"], entity["type_name"]))
+        if match is None or key not in match[entity["kind"]]:
+            return
+        match[entity["kind"]].remove(key)
+        for other in match["Reader" if entity["kind"] == "Writer" else "Writer"]:
+            edges.pop((key, other) if entity["kind"] == "Writer" else (other, key), None)
+
+    for event in events:
+        kind = event["event"]
+        key = event.get("key")
+        if kind == "start":
+            participants.clear()
+            entities.clear()
+            edges.clear()
+            edge_index.clear()
+        elif kind == "participant":
+            participants[key] = {"name": event["name"], "ip": event["ip"], "domain_id": event.get("domain_id")}
+        elif kind == "remove_participant":
+            participants.pop(key, None)
+        elif kind == "entity":
+            if key in entities:
+                unindex(key)
+            entities[key] = {name: event.get(name) for name in ["kind", "topic_name", "type_name", "p_guid", "domain_id"]}
+            match = edge_index.setdefault((event.get("domain_id"), event["topic_name"], event["type_name"]), {"Writer": [], "Reader": []})
+            match[event["kind"]].append(key)
+            if event["kind"] == "Writer":
+                for r in match["Reader"]:
+                    edges[(key, r)] = event["topic_name"]
+            else:
+                for w in match["Writer"]:
+                    edges[(w, key)] = event["topic_name"]
+        elif kind == "remove_entity":
+            if key in entities:
+                unindex(key)
+                del entities[key]
+
+    return participants, entities, edges
+
+
+# Writes entities.csv, participants.csv and edges.csv (same columns as dds_capture.py)
+# from the event log
+def compact(directory, output_dir="."):
+    participants, entities, edges = replay(read_events(directory))
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, "entities.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "topic name", "type name", "kind", "participant ip", "participant name", "participant id", "domain id"])
+        for key, e in entities.items():
+            p = participants.get(e["p_guid"], {})
+            writer.writerow([key, e["topic_name"], e["type_name"], e["kind"], p.get("ip"), p.get("name"), e["p_guid"], e["domain_id"]])
+
+    with open(os.path.join(output_dir, "participants.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "ip", "domain id"])
+        for key, p in participants.items():
+            writer.writerow([key, p["name"], p["ip"], p["domain_id"]])
+
+    with open(os.path.join(output_dir, "edges.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "from", "to", "topic"])
+        for (w, r), topic_name in edges.items():
+            writer.writerow([(w, r), w, r, topic_name])
+
+    return len(participants), len(entities), len(edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact a dds_capture.py event log into entities/participants/edges csv files.")
+    parser.add_argument("directory", help="Event log directory (dds_capture.py --event-log)")
+    parser.add_argument("-o", "--output-dir", default=".", help="Directory for the csv files (default: current directory)")
+    args = parser.parse_args()
+
+    num_participants, num_entities, num_edges = compact(args.directory, args.output_dir)
+    print(f"Participants: {num_participants}  Entities: {num_entities}  Edges: {num_edges}")
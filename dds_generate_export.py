@@ -0,0 +1,141 @@
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+
+# Writes a synthetic Admin Console discovery export with the element layout ProcessFile
+# expects (domain_participants/value/element holding domain_id, participant_data and the
+# publication_data/subscription_data of the participant).
+#
+# Every topic has one type, writers are reliable and readers are reliable, unless one of
+# the rates below says otherwise:
+#   type_mismatch_rate:        endpoints using another type name than their topic's
+#   reliability_mismatch_rate: readers that are best effort
+#   orphan_rate:               endpoints on a topic of their own (no matching writer/reader)
+#   multicast_ratio:           readers with a multicast locator
+#   filter_ratio:              readers with a content filter
+class ExportGenerator:
+    def __init__(self, domains=1, participants=100, endpoints_per_participant=10, topics=100,
+                 multicast_ratio=0.1, filter_ratio=0.1, type_mismatch_rate=0.01,
+                 reliability_mismatch_rate=0.05, orphan_rate=0.01, hosts=None, seed=0):
+        self.domains = domains
+        self.participants = participants
+        self.endpoints_per_participant = endpoints_per_participant
+        self.topics = topics
+        self.multicast_ratio = multicast_ratio
+        self.filter_ratio = filter_ratio
+        self.type_mismatch_rate = type_mismatch_rate
+        self.reliability_mismatch_rate = reliability_mismatch_rate
+        self.orphan_rate = orphan_rate
+        # a few participants per host by default
+        self.hosts = hosts or max(1, participants // 4)
+        self.rng = random.Random(seed)
+        self.orphans = 0
+
+    def write(self, filename):
+        with open(filename, "w", encoding="utf-8", buffering=1024 * 1024) as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write("<admin_console_export>\n<domain_participants>\n<value>\n")
+            number = 0
+            for domain_id in range(self.domains):
+                for _ in range(self.participants):
+                    self.write_participant(f, domain_id, number)
+                    number += 1
+            f.write("</value>\n</domain_participants>\n</admin_console_export>\n")
+
+    def write_participant(self, f, domain_id, number):
+        rng = self.rng
+        host = number % self.hosts
+        ip = [10, host >> 16 & 255, host >> 8 & 255, host & 255]
+        address = ",".join(["0"] * 12 + ["%x" % b for b in ip])
+        key = ",".join(str(b) for b in number.to_bytes(16, "big"))
+
+        f.write(f"<element>\n<domain_id>{domain_id}</domain_id>\n<participant_data>\n")
+        f.write(f"<key><value>{key}</value></key>\n")
+        f.write(f"<participant_name><name>app{number % 1000}</name></participant_name>\n")
+        f.write("<property><value>\n")
+        f.write(f"<element><name>dds.sys_info.hostname</name><value>host{host}</value></element>\n")
+        f.write(f"<element><name>dds.sys_info.executable_filepath</name><value>/opt/apps/app{number % 1000}</value></element>\n")
+        f.write("</value></property>\n")
+        f.write("<default_unicast_locators>\n")
+        f.write("<element><kind>16</kind><port>7411</port><address>0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1</address></element>\n")
+        f.write(f"<element><kind>1</kind><port>7411</port><address>{address}</address></element>\n")
+        f.write("</default_unicast_locators>\n</participant_data>\n")
+
+        writers = sum(rng.random() < 0.5 for _ in range(self.endpoints_per_participant))
+        readers = self.endpoints_per_participant - writers
+        f.write("<publications><value>\n")
+        for _ in range(writers):
+            self.write_endpoint(f, "publication_data")
+        f.write("</value></publications>\n<subscriptions><value>\n")
+        for _ in range(readers):
+            self.write_endpoint(f, "subscription_data")
+        f.write("</value></subscriptions>\n</element>\n")
+
+    def write_endpoint(self, f, tag):
+        rng = self.rng
+        reader = tag == "subscription_data"
+
+        if rng.random() < self.orphan_rate:
+            self.orphans += 1
+            topic_name = f"Orphan{self.orphans}"
+            type_name = f"OrphanType{self.orphans}"
+        else:
+            topic = rng.randrange(self.topics)
+            topic_name = f"Topic{topic}"
+            type_name = f"module::Type{topic}"
+            if rng.random() < self.type_mismatch_rate:
+                type_name = f"module::Type{topic}_v2"
+
+        reliable = "RELIABLE_RELIABILITY_QOS"
+        if reader and rng.random() < self.reliability_mismatch_rate:
+            reliable = "BEST_EFFORT_RELIABILITY_QOS"
+
+        f.write(f"<element><{tag}>\n<topic_name>{topic_name}</topic_name>\n<type_name>{type_name}</type_name>\n")
+        f.write(f"<max_sample_serialized_size>{rng.randrange(16, 65536)}</max_sample_serialized_size>\n")
+        f.write(f"<reliability><kind>{reliable}</kind></reliability>\n")
+        if rng.random() < 0.5:
+            f.write("<deadline><period><sec>DURATION_INFINITE_SEC</sec><nanosec>DURATION_INFINITE_NSEC</nanosec></period></deadline>\n")
+        else:
+            f.write(f"<deadline><period><sec>{rng.randrange(5)}</sec><nanosec>{rng.randrange(10) * 100000000}</nanosec></period></deadline>\n")
+        if reader and rng.random() < self.filter_ratio:
+            f.write(f"<content_filter_property><filter_expression>{escape(f'id > {rng.randrange(100)}')}</filter_expression></content_filter_property>\n")
+        if reader and rng.random() < self.multicast_ratio:
+            group = rng.randrange(1, 255)
+            f.write(f"<multicast_locators><element><kind>1</kind><port>7401</port><address>0,0,0,0,0,0,0,0,0,0,0,0,ef,ff,0,{group:x}</address></element></multicast_locators>\n")
+        f.write(f"</{tag}></element>\n")
+
+
+def add_generator_arguments(parser):
+    parser.add_argument("--domains", type=int, default=1, help="Number of domains (default: 1)")
+    parser.add_argument("--participants", type=int, default=100, help="Participants per domain (default: 100)")
+    parser.add_argument("--endpoints-per-participant", type=int, default=10, help="Endpoints per participant (default: 10)")
+    parser.add_argument("--topics", type=int, default=100, help="Distinct topics (default: 100)")
+    parser.add_argument("--multicast-ratio", type=float, default=0.1, help="Fraction of readers with a multicast locator (default: 0.1)")
+    parser.add_argument("--filter-ratio", type=float, default=0.1, help="Fraction of readers with a content filter (default: 0.1)")
+    parser.add_argument("--type-mismatch-rate", type=float, default=0.01, help="Fraction of endpoints with another type name than their topic's (default: 0.01)")
+    parser.add_argument("--reliability-mismatch-rate", type=float, default=0.05, help="Fraction of readers that are best effort (default: 0.05)")
+    parser.add_argument("--orphan-rate", type=float, default=0.01, help="Fraction of endpoints on a topic with no matching writer/reader (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+
+def generator_from_args(args, **overrides):
+    options = dict(domains=args.domains, participants=args.participants,
+                   endpoints_per_participant=args.endpoints_per_participant, topics=args.topics,
+                   multicast_ratio=args.multicast_ratio, filter_ratio=args.filter_ratio,
+                   type_mismatch_rate=args.type_mismatch_rate,
+                   reliability_mismatch_rate=args.reliability_mismatch_rate,
+                   orphan_rate=args.orphan_rate, seed=args.seed)
+    options.update(overrides)
+    return ExportGenerator(**options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic Admin Console discovery export.")
+    parser.add_argument("filename", help="Path of the export to write")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    generator_from_args(args).write(args.filename)
+    print(f"Wrote {args.domains * args.participants} participants, "
+          f"{args.domains * args.participants * args.endpoints_per_participant} endpoints to {args.filename}")
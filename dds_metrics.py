@@ -0,0 +1,167 @@
+import bisect
+import os
+import tempfile
+import threading
+import time
+
+
+# Discovery metrics of dds_capture.py and rtispy.py (--metrics-file)
+#
+# Counters and histograms written as a Prometheus textfile (for node_exporter's textfile
+# collector) every interval seconds and printed as a summary at the end of the run. The
+# tools keep a module-level metrics = None when it isn't enabled and only check for None
+# at each instrumentation point, so disabled metrics cost one comparison.
+
+DURATION_BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5]
+BATCH_BUCKETS = [1, 2, 5, 10, 50, 100, 500, 1000, 5000]
+MATCH_BUCKETS = [0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300]
+
+DEFAULT_INTERVAL = 15
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+    def summary(self, elapsed):
+        with self.lock:
+            return [f"{self.name}{format_labels(self.labels, label_values)}: {value} ({value / elapsed:.1f}/s)"
+                    for label_values, value in sorted(self.values.items())]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [count per bucket (+Inf last), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), label_values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+    # upper bound of the bucket holding the given quantile
+    def quantile(self, counts, q):
+        target = q * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float("inf")], counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def summary(self, elapsed):
+        lines = []
+        with self.lock:
+            for label_values, (counts, total) in sorted(self.values.items()):
+                count = sum(counts)
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)}: count {count}, "
+                             f"mean {total / count:.4g}, p50 <= {self.quantile(counts, 0.5)}, p99 <= {self.quantile(counts, 0.99)}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, path=None, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.metrics = []
+        self.start = time.monotonic()
+        self.next_write = self.start + interval
+
+    def counter(self, name, help, labels=()):
+        self.metrics.append(Counter(name, help, labels))
+        return self.metrics[-1]
+
+    def histogram(self, name, help, buckets, labels=()):
+        self.metrics.append(Histogram(name, help, buckets, labels))
+        return self.metrics[-1]
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # Replace the textfile at once so the collector never reads half of it
+    def write(self):
+        if self.path is None:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.render())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, self.path)
+
+    def write_if_due(self):
+        now = time.monotonic()
+        if now >= self.next_write:
+            self.next_write = now + self.interval
+            self.write()
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        lines = [f"Metrics over {elapsed:.0f} s"]
+        for metric in self.metrics:
+            lines.extend(metric.summary(elapsed))
+        return "\n".join(lines)
+
+
+# The discovery metrics both tools report (edge matching and the main loop's tick only
+# apply to dds_capture.py)
+class DiscoveryMetrics(Metrics):
+    def __init__(self, path=None, interval=DEFAULT_INTERVAL):
+        super().__init__(path, interval)
+        self.discovered = self.counter("dds_discovered_total", "Participants/endpoints discovered", ("entity",))
+        self.callback_seconds = self.histogram("dds_listener_callback_seconds", "Duration of the listeners' on_data_available",
+                                               DURATION_BUCKETS, ("listener",))
+        self.take_samples = self.histogram("dds_listener_take_samples", "Samples returned by each take()",
+                                           BATCH_BUCKETS, ("listener",))
+        self.first_match_seconds = self.histogram("dds_first_match_seconds", "Time from an endpoint's discovery to its first edge",
+                                                  MATCH_BUCKETS)
+        self.tick_seconds = self.histogram("dds_tick_seconds", "Duration of the main loop's work per iteration",
+                                           DURATION_BUCKETS)
+
+    # one on_data_available call that started at start (perf_counter) and took samples
+    def callback(self, listener, start, samples):
+        self.callback_seconds.observe(time.perf_counter() - start, listener)
+        self.take_samples.observe(samples, listener)
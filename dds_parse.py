@@ -0,0 +1,503 @@
+import hashlib
+import io
+import mmap
+import os
+import pickle
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+
+# Path (below the root) of each domain participant in an Admin Console discovery export
+DOMAIN_PARTICIPANTS_PATH = ".//domain_participants/value/element"
+DOMAIN_PARTICIPANT_TAGS = ["domain_participants", "value", "element"]
+
+
+class Device:
+    def __init__(self, name=None, ip=None):
+        self.name = name
+        self.ip = ip
+
+
+class Participant:
+    def __init__(self, name=None, key=None, device=None, path=None, index=None):
+        self.name = name
+        self.key = key
+        self.device = device
+        self.path = path
+        # position of the participant in the export, across all domains
+        self.index = index
+
+
+class Endpoint:
+    def __init__(self, kind=None, topic_name=None, type_name=None, participant=None, reliable=None, max_sample_serialized_size=None, deadline=None, filter=None, multicast=None):
+        self.kind = kind
+        self.topic_name = topic_name
+        self.type_name = type_name
+        self.max_sample_serialized_size = max_sample_serialized_size
+        self.participant = participant
+        self.reliable = reliable
+        self.deadline = deadline
+        self.filter = filter
+        self.multicast = multicast
+
+class Domain:
+    def __init__(self, domain_id=None):
+        self.domain_id = domain_id
+        self.participants = []
+        self.endpoints = []
+
+
+def parse_participant(participant_data):
+
+    participant_name = None
+    participant_key = None
+    property_name = None
+    property_value = None
+    hostname = None
+    filepath = None
+
+    for child in participant_data:
+
+        if child.tag == "key":
+            participant_key = child.find("value").text
+
+        if child.tag == "participant_name":
+            # print("p_name")
+            if child.find("name") is not None:
+                participant_name = child.find("name").text
+
+        if child.tag == "property":
+            # print("p_name")
+
+            for element in child.iter("element"):
+                if element.find("name") is not None:
+                    property_name = element.find("name").text
+
+                if element.find("value") is not None:
+                    property_value = element.find("value").text
+
+                if property_name == "dds.sys_info.hostname":
+                    hostname = property_value
+
+                if property_name == "dds.sys_info.executable_filepath":
+                    filepath = property_value
+
+            if child.find("name") is not None:
+                participant_name = child.find("name").text
+
+        if child.tag == "default_unicast_locators":
+            for element in child.iter("element"):
+                if element.find("address") is not None:
+                    address = element.find("address").text
+                    ip_list = address.split(",")
+                    last_4_ip_list = ip_list[-4:]
+
+                if element.find("kind") is not None:
+                    kind = element.find("kind").text
+                    # If UDP Locator
+                    if kind == "1":
+                        ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
+                        ip_str = ".".join(map(str, ip_bytes))
+                        break
+
+    device = Device(hostname, ip_str)
+    dp = Participant(participant_name, participant_key, device, filepath)
+
+    return dp
+
+
+def parse_endpoint(data_element, kind, participant):
+
+    topic_name = None
+    type_name = None
+    reliable = None
+    deadline = None
+    content_filter = None
+    multicast = None
+    multicast_ip_str = None
+    max_sample_serialized_size = ""
+    
+    for child in data_element:
+        if child.tag == "topic_name":
+            topic_name = child.text
+            # print(topic_name)
+        elif child.tag == "type_name":
+            type_name = child.text
+            # print(type_name)
+        elif child.tag == "max_sample_serialized_size":
+            max_sample_serialized_size = child.text
+        elif child.tag == "reliability":
+            reliable = child.find("kind").text
+        elif child.tag == "deadline":
+            sec = child.find("period/sec").text
+            nanosec = child.find("period/nanosec").text
+            if (sec == "DURATION_INFINITE_SEC" or nanosec == "DURATION_INFINITE_NSEC"):
+                deadline = ""
+            else:
+                deadline = int(sec) + int(nanosec) / 1000000000
+        elif child.tag == "content_filter_property":
+            if child.find("filter_expression") is not None:
+                content_filter = child.find("filter_expression").text
+        elif child.tag == "multicast_locators":
+            for element in child.iter("element"):
+                # print("multicast")
+                if element.find("address") is not None:
+                    multicast = element.find("address").text
+                    ip_list = multicast.split(",")
+                    last_4_ip_list = ip_list[-4:]
+                    ip_bytes = [int(hex_val, 16) for hex_val in last_4_ip_list]
+                    multicast_ip_str = ".".join(map(str, ip_bytes))
+
+    endpoint = Endpoint(kind, topic_name, type_name, participant, reliable, max_sample_serialized_size, deadline, content_filter, multicast_ip_str)
+
+    return endpoint
+
+
+# Yield every domain_participants/value/element of an Admin Console export.
+# stream=False loads the whole DOM with ET.parse. stream=True reads the file with
+# iterparse and frees each participant element once the caller moves on to the
+# next one, so memory stays flat however big the export is. Both modes yield the
+# same elements in the same (document) order.
+def iter_domain_participants(filename, stream=False):
+    if not stream:
+        tree = ET.parse(filename)
+        root = tree.getroot()
+        yield from root.findall(DOMAIN_PARTICIPANTS_PATH)
+        return
+
+    stack = []  # currently open elements
+    tags = []  # tags of the currently open elements
+    match_depth = 0  # depth of the participant element being built, 0 if none
+
+    for event, elem in ET.iterparse(filename, events=("start", "end")):
+
+        if event == "start":
+            stack.append(elem)
+            tags.append(elem.tag)
+            # the root itself can't match a ".//" path, hence > 3
+            if not match_depth and len(tags) > 3 and tags[-3:] == DOMAIN_PARTICIPANT_TAGS:
+                match_depth = len(stack)
+            continue
+
+        if match_depth == len(stack):
+            yield elem
+            match_depth = 0
+
+        stack.pop()
+        tags.pop()
+
+        # Anything outside of a participant being built is done with, drop it
+        # so the tree never grows past the element currently being parsed
+        if not match_depth:
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+# Parse an export into Domain objects (keyed by domain id, in order of appearance) holding
+# their participants and endpoints. This is the one model all the reports are built from.
+# jobs > 1 parses shards of the file in that many worker processes, see parse_sharded.
+def parse_domains(filename, stream=False, cache=None, jobs=1):
+
+    if cache is not None:
+        columns = cache.load(filename, "domains")
+        if columns is not None:
+            return domains_from_columns(columns)
+
+    if jobs > 1:
+        domains = parse_sharded(filename, jobs)
+    else:
+        domains = build_domains(iter_domain_participants(filename, stream))
+
+    if cache is not None:
+        cache.store(filename, "domains", domains_to_columns(domains))
+
+    return domains
+
+
+# Domains from domain_participants/value/element elements, first_index is the position
+# in the export of the first of them
+def build_domains(domain_participants, first_index=0):
+
+    domains = {}
+    participant_count = first_index
+
+    for domain_participant in domain_participants:
+        
+        domain_id = domain_participant.find("domain_id").text
+        
+        domain = domains.get(domain_id)
+        if domain is None:
+            domain = Domain(domain_id)
+            domains[domain_id] = domain
+            
+        participant_data = domain_participant.find("participant_data")
+        participant = parse_participant(participant_data)
+        participant.index = participant_count
+        participant_count += 1
+        
+        domain.participants.append(participant)
+        
+        publications = domain_participant.findall(".//publication_data")
+        for publication_data in publications:
+            publication = parse_endpoint(publication_data, "writer", participant)
+            domain.endpoints.append(publication)
+            
+        subscriptions = domain_participant.findall(".//subscription_data")
+        for subscription_data in subscriptions:
+            subscription = parse_endpoint(subscription_data, "reader", participant)
+            domain.endpoints.append(subscription)
+
+    return domains
+
+
+# Sharded parsing
+#
+# find_participant_offsets scans the raw bytes for the start/end offsets of every
+# domain_participants/value/element. Only <value> and <element> tags are looked at: in
+# well formed XML the </element> closing a participant is the first one that brings the
+# element nesting back to where it started, whatever other tags are in between.
+# Consecutive participants are then grouped into shards of about the same size, each
+# shard is parsed in a worker process (wrapped back into domain_participants/value so
+# the normal parser applies) and the shards' columns are merged in file order, which
+# gives exactly the domains of a serial parse.
+
+PARTICIPANTS_START = re.compile(rb"<domain_participants[\s>]")
+VALUE_OR_ELEMENT_TAG = re.compile(rb"<(/?)(value|element)\b[^>]*?(/?)>")
+
+# Shards per worker, more than one so a slow shard doesn't leave the other workers idle
+SHARDS_PER_JOB = 4
+
+
+def find_participant_offsets(filename):
+    offsets = []
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for section in PARTICIPANTS_START.finditer(data):
+            in_value = False
+            depth = 0  # <element> nesting inside domain_participants/value
+            start = None
+            for tag in VALUE_OR_ELEMENT_TAG.finditer(data, section.end()):
+                closing, name, self_closing = tag.groups()
+                if name == b"value":
+                    if depth == 0:
+                        if closing:
+                            if in_value:
+                                break  # end of domain_participants/value
+                        elif not self_closing:
+                            in_value = True
+                    continue
+                if not in_value or self_closing:
+                    continue
+                if closing:
+                    depth -= 1
+                    if depth == 0:
+                        offsets.append((start, tag.end()))
+                else:
+                    if depth == 0:
+                        start = tag.start()
+                    depth += 1
+    return offsets
+
+
+# Group the participants into about num_shards runs of similar size in bytes,
+# as (start, end, index of the first participant)
+def make_shards(offsets, num_shards):
+    if not offsets:
+        return []
+    total = offsets[-1][1] - offsets[0][0]
+    target = max(1, total // num_shards)
+    shards = []
+    first = 0
+    for i, (start, end) in enumerate(offsets):
+        if end - offsets[first][0] >= target or i == len(offsets) - 1:
+            shards.append((offsets[first][0], end, first))
+            first = i + 1
+    return shards
+
+
+XML_DECLARATION = re.compile(rb"\s*<\?xml[^>]*\?>")
+
+
+def parse_shard(filename, start, end, first_index):
+    with open(filename, "rb") as f:
+        # keep the declaration so the shard is decoded with the export's encoding
+        declaration = XML_DECLARATION.match(f.read(1024))
+        f.seek(start)
+        data = f.read(end - start)
+    xml = b"<shard><domain_participants><value>" + data + b"</value></domain_participants></shard>"
+    if declaration:
+        xml = declaration.group().lstrip() + xml
+    domains = build_domains(iter_domain_participants(io.BytesIO(xml), stream=True), first_index)
+    return domains_to_columns(domains)
+
+
+def parse_sharded(filename, jobs):
+    shards = make_shards(find_participant_offsets(filename), jobs * SHARDS_PER_JOB)
+    domains = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(parse_shard, filename, start, end, first_index) for start, end, first_index in shards]
+        for future in futures:
+            domains_from_columns(future.result(), domains)
+    return domains
+
+
+# Parsed domains as columns for the parse cache, domain by domain so that loading them
+# back gives the same domains, participants and endpoints in the same order
+def domains_to_columns(domains):
+    participant_columns = {"domain_id": [], "name": [], "key": [], "device_name": [], "device_ip": [], "path": [], "index": []}
+    endpoint_columns = {"participant": [], "kind": [], "topic_name": [], "type_name": [], "reliable": [],
+                        "max_sample_serialized_size": [], "deadline": [], "filter": [], "multicast": []}
+    for domain in domains.values():
+        participant_index = {}
+        for participant in domain.participants:
+            participant_index[id(participant)] = len(participant_columns["key"])
+            participant_columns["domain_id"].append(domain.domain_id)
+            participant_columns["name"].append(participant.name)
+            participant_columns["key"].append(participant.key)
+            participant_columns["device_name"].append(participant.device.name)
+            participant_columns["device_ip"].append(participant.device.ip)
+            participant_columns["path"].append(participant.path)
+            participant_columns["index"].append(participant.index)
+        for endpoint in domain.endpoints:
+            endpoint_columns["participant"].append(participant_index[id(endpoint.participant)])
+            for column in ("kind", "topic_name", "type_name", "reliable", "max_sample_serialized_size", "deadline", "filter", "multicast"):
+                endpoint_columns[column].append(getattr(endpoint, column))
+    return {"participants": participant_columns, "endpoints": endpoint_columns}
+
+
+# domains is the dict to add to, shards are merged by loading them one after the other
+def domains_from_columns(columns, domains=None):
+    if domains is None:
+        domains = {}
+    participant_columns = columns["participants"]
+    participants = []
+    for domain_id, name, key, device_name, device_ip, path, index in zip(
+            participant_columns["domain_id"], participant_columns["name"], participant_columns["key"],
+            participant_columns["device_name"], participant_columns["device_ip"], participant_columns["path"],
+            participant_columns["index"]):
+        domain = domains.get(domain_id)
+        if domain is None:
+            domain = Domain(domain_id)
+            domains[domain_id] = domain
+        participant = Participant(name, key, Device(device_name, device_ip), path, index)
+        participants.append((domain, participant))
+        domain.participants.append(participant)
+
+    endpoint_columns = columns["endpoints"]
+    for index, kind, topic_name, type_name, reliable, max_sample_serialized_size, deadline, content_filter, multicast in zip(
+            endpoint_columns["participant"], endpoint_columns["kind"], endpoint_columns["topic_name"],
+            endpoint_columns["type_name"], endpoint_columns["reliable"], endpoint_columns["max_sample_serialized_size"],
+            endpoint_columns["deadline"], endpoint_columns["filter"], endpoint_columns["multicast"]):
+        domain, participant = participants[index]
+        domain.endpoints.append(Endpoint(kind, topic_name, type_name, participant, reliable,
+                                         max_sample_serialized_size, deadline, content_filter, multicast))
+    return domains
+
+
+# Parse cache
+#
+# Parsing a big export takes far longer than anything done with the result, so the parsed
+# participants/endpoints are kept on disk, keyed by the export's content hash and the
+# parser version. Entries are pickled dicts of columns (one list per column), which load
+# much faster than the XML parses. The cache is capped in size, the least recently used
+# entries are evicted first.
+
+# Bump when the parsed output changes so older cache entries are no longer used
+PARSER_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get("DDS_ANALYZE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "dds_analyze"))
+DEFAULT_CACHE_MAX_MB = 1024
+CACHE_SUFFIX = ".pickle"
+# Temporary files of stores that were killed outright are removed once this old (a
+# concurrent run may still be writing a newer one)
+STALE_TMP_SECONDS = 3600
+
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.digests = {}  # filename -> content hash, so a miss + store hashes the file once
+
+    def path(self, filename, name):
+        if filename not in self.digests:
+            self.digests[filename] = file_hash(filename)
+        return os.path.join(self.cache_dir, f"{self.digests[filename]}-{name}-v{PARSER_VERSION}{CACHE_SUFFIX}")
+
+    # Returns the columns stored for this export or None
+    def load(self, filename, name):
+        path = self.path(filename, name)
+        try:
+            with open(path, "rb") as f:
+                columns = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)  # most recently used
+        return columns
+
+    def store(self, filename, name, columns):
+        path = self.path(filename, name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write to a temporary file first so an interrupted run never leaves a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        paths = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(CACHE_SUFFIX)]
+        return sorted(paths, key=os.path.getmtime)  # least recently used first
+
+    def evict(self):
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            tmp_path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp") and now - os.path.getmtime(tmp_path) > STALE_TMP_SECONDS:
+                os.remove(tmp_path)
+
+        entries = self.entries()
+        total = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def clear(self):
+        for path in self.entries():
+            os.remove(path)
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the parse cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the parse cache before running")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Parse cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+                        help=f"Parse cache size cap in MB, least recently used entries are evicted (default: {DEFAULT_CACHE_MAX_MB})")
+
+
+# The cache to use for the parsed command line arguments, None with --no-cache
+def cache_from_args(args):
+    cache = ParseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    if args.clear_cache:
+        cache.clear()
+    if args.no_cache:
+        return None
+    return cache
@@ -0,0 +1,39 @@
+import argparse
+from dds_parse import parse_domains, add_cache_arguments, cache_from_args
+
+
+# Parses the export once and builds the selected reports from that single parse:
+#   xlsx: the dds_analyze.py workbooks, one per domain
+#   csv:  the dds_analyze_v3.py csv files (devices, participants, rule results)
+# The exporters are imported only when selected, so e.g. the xlsx report doesn't need pandas.
+def run_reports(filename, outputs, stream=False, cache=None, jobs=1, constant_memory=False, parse_jobs=1):
+
+    domains = parse_domains(filename, stream, cache, parse_jobs)
+
+    if "xlsx" in outputs:
+        from dds_analyze import export_workbooks
+        export_workbooks(domains, filename, jobs, constant_memory)
+
+    if "csv" in outputs:
+        from dds_analyze_v3 import frames_from_domains, export_csvs
+        participants_df, endpoints_df = frames_from_domains(domains)
+        export_csvs(participants_df, endpoints_df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the xlsx and/or csv reports of an Admin Console export from one parse.")
+    parser.add_argument("filename", help="Path to the file")
+    parser.add_argument("-o", "--output", action="append", choices=["xlsx", "csv"],
+                        help="Report to build, can be repeated (default: all)")
+    parser.add_argument("--stream", action="store_true", help="Stream the file with iterparse instead of loading the whole XML tree (for very large exports)")
+    parser.add_argument("--constant-memory", action="store_true", help="Write the workbooks row by row (openpyxl write-only mode) instead of keeping every cell in memory")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes building the per-domain workbooks (default: 1, serial)")
+    parser.add_argument("--parse-jobs", type=int, default=1, help="Number of worker processes parsing shards of the file (default: 1, serial)")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    filename = args.filename
+
+    try:
+        run_reports(filename, args.output or ["xlsx", "csv"], args.stream, cache_from_args(args), args.jobs, args.constant_memory, args.parse_jobs)
+    except FileNotFoundError:
+        print(f"Error: File '{filename}' not found.")
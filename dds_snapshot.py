@@ -0,0 +1,222 @@
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+from dds_store import guid_str
+
+
+# Delta snapshots of dds_capture.py (--snapshot-dir)
+#
+# The first snapshot of a capture is a base with every participant, entity and edge, each
+# later one (a generation) only has the rows added, changed and removed since the
+# previous one, so a snapshot of a mostly idle system is a few hundred bytes whatever its
+# size. Generations are gzipped JSON files, snapshot-NNNNNN.json.gz:
+#   {"generation": n, "time": ..., "base": true/false,
+#    "participants": {"added": [rows], "changed": [rows], "removed": [ids]},
+#    "entities": {...}, "edges": {...}}
+# Rows are the rows of dds_capture.py's csv files, the first column is the row's id. A
+# restarted capture writes a new base after the existing generations. rebuild() replays
+# the generations from the last base up to a generation.
+#
+# The capture calls mark() for every record it adds, changes or removes, so a delta costs
+# the number of changes, not a comparison of everything. The main loop only collects the
+# values to write (references, for the base); formatting, compressing and writing the
+# file happen in a thread so the ingest queue keeps draining meanwhile.
+
+DEFAULT_SNAPSHOT_INTERVAL = 3600
+# gzip's default (9) takes several times longer for about the same size
+COMPRESS_LEVEL = 6
+
+TABLES = {
+    "entities": ["id", "topic name", "type name", "kind", "participant ip", "participant name", "participant id", "domain id"],
+    "participants": ["id", "name", "ip", "domain id"],
+    "edges": ["id", "from", "to", "topic"],
+}
+
+
+# The fields of a record written to a snapshot, references only (the records change
+# after the main loop hands them to the writer's thread, these tuples don't)
+def record_value(table, record):
+    if table == "entities":
+        return (record.topic_name, record.type_name, record.kind, record.p_ip, record.p_name, record.p_guid, record.domain_id)
+    if table == "participants":
+        return (record.name, record.ip, record.domain_id)
+    return record.topic_name
+
+
+def csv_row(table, key, value):
+    if table == "entities":
+        topic_name, type_name, kind, p_ip, p_name, p_guid, domain_id = value
+        return [guid_str(key), topic_name, type_name, kind, p_ip, p_name, guid_str(p_guid), domain_id]
+    if table == "participants":
+        return [guid_str(key), *value]
+    w, r = guid_str(key[0]), guid_str(key[1])
+    return [str((w, r)), w, r, value]
+
+
+def row_id(table, key):
+    if table == "edges":
+        return str((guid_str(key[0]), guid_str(key[1])))
+    return guid_str(key)
+
+
+class SnapshotWriter:
+    def __init__(self, directory, interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.next_write = time.monotonic() + interval
+        os.makedirs(directory, exist_ok=True)
+        existing = generations(directory)
+        self.generation = existing[-1] + 1 if existing else 0
+        # whether the base was taken, the changes are only tracked after it
+        self.base_taken = False
+        # table -> {key: "added", "changed" or "removed"} since the last snapshot
+        self.changes = {table: {} for table in TABLES}
+        # thread writing the last snapshot
+        self.thread = None
+
+    def mark(self, table, key, change):
+        if not self.base_taken:
+            return
+        changes = self.changes[table]
+        previous = changes.get(key)
+        if previous is None:
+            changes[key] = change
+        elif change == "removed":
+            # added and removed again since the last snapshot: nothing to write
+            if previous == "added":
+                del changes[key]
+            else:
+                changes[key] = "removed"
+        elif previous == "removed":
+            # removed and added again
+            changes[key] = "changed"
+
+    # Starts writing the next generation from the capture's current records, returns the
+    # (added, changed, removed) counts
+    def write(self, participants, entities, edges):
+        self.wait()
+        tables = {"entities": entities, "participants": participants, "edges": edges}
+        snapshot = {"generation": self.generation, "time": round(time.time(), 3), "base": not self.base_taken}
+        counts = [0, 0, 0]
+        delta = {}
+        for table, records in tables.items():
+            if snapshot["base"]:
+                delta[table] = ([(key, record_value(table, record)) for key, record in records.items()], [], [])
+            else:
+                changes = self.changes[table]
+                delta[table] = ([(key, record_value(table, records[key])) for key, change in changes.items() if change == "added"],
+                                [(key, record_value(table, records[key])) for key, change in changes.items() if change == "changed"],
+                                [key for key, change in changes.items() if change == "removed"])
+            counts = [count + len(part) for count, part in zip(counts, delta[table])]
+        self.base_taken = True
+        self.changes = {table: {} for table in TABLES}
+
+        self.thread = threading.Thread(target=self.write_file, args=(snapshot, delta))
+        self.thread.start()
+        self.generation += 1
+        return counts
+
+    # Writes a generation once the last one is written, returns the counts or None
+    def write_if_due(self, participants, entities, edges):
+        if time.monotonic() < self.next_write or (self.thread is not None and self.thread.is_alive()):
+            return None
+        self.next_write = time.monotonic() + self.interval
+        return self.write(participants, entities, edges)
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def write_file(self, snapshot, delta):
+        for table, (added, changed, removed) in delta.items():
+            snapshot[table] = {"added": [csv_row(table, key, value) for key, value in added],
+                               "changed": [csv_row(table, key, value) for key, value in changed],
+                               "removed": [row_id(table, key) for key in removed]}
+
+        # write then rename, a generation file is either complete or missing
+        path = snapshot_path(self.directory, snapshot["generation"])
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f:
+            f.write(json.dumps(snapshot, separators=(",", ":")))
+        os.replace(path + ".tmp", path)
+
+
+def snapshot_path(directory, generation):
+    return os.path.join(directory, f"snapshot-{generation:06d}.json.gz")
+
+
+def generations(directory):
+    return sorted(int(os.path.basename(path)[len("snapshot-"):-len(".json.gz")])
+                  for path in glob.glob(os.path.join(directory, "snapshot-*.json.gz")))
+
+
+def read_snapshot(directory, generation):
+    with gzip.open(snapshot_path(directory, generation), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# The state at a generation (the latest by default) as table -> {id: row}
+def rebuild(directory, generation=None):
+    available = generations(directory)
+    if generation is None:
+        generation = available[-1] if available else None
+    if generation not in available:
+        raise ValueError(f"No generation {generation} in {directory}")
+
+    # replay from the last base at or before the generation
+    snapshots = []
+    for number in reversed([number for number in available if number <= generation]):
+        snapshots.append(read_snapshot(directory, number))
+        if snapshots[-1]["base"]:
+            break
+    else:
+        raise ValueError(f"No base snapshot before generation {generation} in {directory}")
+
+    state = {table: {} for table in TABLES}
+    for snapshot in reversed(snapshots):
+        for table, rows in state.items():
+            delta = snapshot[table]
+            for row in delta["added"] + delta["changed"]:
+                rows[row[0]] = row
+            for removed_id in delta["removed"]:
+                rows.pop(removed_id, None)
+    return state
+
+
+# Writes entities.csv, participants.csv and edges.csv of a generation
+def write_csvs(state, output_dir="."):
+    os.makedirs(output_dir, exist_ok=True)
+    for table, header in TABLES.items():
+        with open(os.path.join(output_dir, f"{table}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(state[table].values())
+
+
+def list_generations(directory):
+    for generation in generations(directory):
+        snapshot = read_snapshot(directory, generation)
+        changes = "  ".join(f"{table} +{len(snapshot[table]['added'])} ~{len(snapshot[table]['changed'])} -{len(snapshot[table]['removed'])}"
+                            for table in TABLES)
+        size = os.path.getsize(snapshot_path(directory, generation))
+        print(f"{generation:6d}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['time']))}  "
+              f"{'base ' if snapshot['base'] else 'delta'}  {size:>10} bytes  {changes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the delta snapshots of dds_capture.py or rebuild the csv files of a generation.")
+    parser.add_argument("directory", help="Snapshot directory (dds_capture.py --snapshot-dir)")
+    parser.add_argument("-g", "--generation", type=int, help="Generation to rebuild (default: the latest)")
+    parser.add_argument("-o", "--output-dir", help="Directory for the rebuilt csv files (without it the generations are listed)")
+    args = parser.parse_args()
+
+    if args.output_dir is None:
+        list_generations(args.directory)
+    else:
+        state = rebuild(args.directory, args.generation)
+        write_csvs(state, args.output_dir)
+        print(f"Participants: {len(state['participants'])}  Entities: {len(state['entities'])}  Edges: {len(state['edges'])}")
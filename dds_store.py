@@ -0,0 +1,60 @@
+import struct
+import sys
+
+
+# Records and keys shared by dds_capture.py and rtispy.py
+#
+# Participants and endpoints are keyed by their 16-byte GUID as bytes. Joining the key
+# octets into a decimal string/int (the old keys) is slower, larger, and not unique:
+# [1, 23, ...] and [12, 3, ...] join to the same digits. The records use __slots__ (no
+# per-object __dict__) and the topic/type names are interned, so the thousands of
+# endpoints of a topic share one string.
+
+
+# BuiltinTopicKey.value to a 16-byte key: 16 octets, or 4 32-bit words on older Connext
+def guid_key(value):
+    if len(value) == 4:
+        return struct.pack(">4I", *(word & 0xffffffff for word in value))
+    return bytes(value)
+
+
+# Printable form of a key (csv files, event log, table row keys)
+def guid_str(key):
+    return key.hex()
+
+
+def intern_name(name):
+    return sys.intern(name) if name is not None else None
+
+
+class Participant:
+    __slots__ = ("name", "ip", "domain_id")
+
+    def __init__(self, name=None, ip=None, domain_id=None):
+        self.name = name
+        self.ip = ip
+        self.domain_id = domain_id
+
+
+class Endpoint:
+    __slots__ = ("topic_name", "type_name", "kind", "p_guid", "p_name", "p_ip", "type", "domain_id")
+
+    def __init__(self, topic_name=None, type_name=None, kind=None, p_guid=None, p_name=None, p_ip=None, type=None, domain_id=None):
+        self.topic_name = intern_name(topic_name)
+        self.type_name = intern_name(type_name)
+        self.kind = kind
+        self.p_guid = p_guid
+        self.p_name = p_name
+        self.p_ip = p_ip
+        # the discovered DynamicType (rtispy subscribes with it)
+        self.type = type
+        self.domain_id = domain_id
+
+
+class Edge:
+    __slots__ = ("source", "target", "topic_name")
+
+    def __init__(self, source=None, target=None, topic_name=None):
+        self.source = source
+        self.target = target
+        self.topic_name = topic_name
@@ -0,0 +1,161 @@
+import time
+
+
+# Throughput, sequence gaps and latency of a topic subscribed by rtispy.py
+#
+# record() runs in the reader's listener for every sample and only does constant work:
+# counters in per-second slots for the rates, the last sequence number per writer for the
+# gaps, and one bucket increment in a log-linear (HDR-style) latency histogram. Sizes
+# cost a serialization, so only some samples come with one and bytes/s is the sample rate
+# times their average size. The histograms and slots are fixed-size lists, so render()
+# can read them from the UI thread while the listener writes.
+
+# Seconds the rates are averaged over and the latency histogram covers (between one and
+# two windows, the histograms rotate every window)
+WINDOW = 5
+# Each power of two of the latency (in microseconds) is split in SUB_BUCKETS linear
+# buckets, about 3% precision
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+HALF_BUCKETS = SUB_BUCKETS // 2
+# Up to 2^40 us (~12 days)
+MAX_BITS = 40
+NUM_BUCKETS = SUB_BUCKETS + (MAX_BITS - SUB_BITS) * HALF_BUCKETS
+
+PERCENTILES = [50, 90, 99, 99.9, 100]
+
+
+def time_seconds(t):
+    return t.sec + t.nanosec * 1e-9
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = min(value.bit_length(), MAX_BITS) - SUB_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + (min(value >> shift, SUB_BUCKETS - 1) - HALF_BUCKETS)
+
+
+# lowest value of a bucket
+def bucket_value(index):
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF_BUCKETS + 1
+    return (HALF_BUCKETS + (index - SUB_BUCKETS) % HALF_BUCKETS) << shift
+
+
+def format_us(value):
+    if value < 1000:
+        return f"{value} us"
+    if value < 1000000:
+        return f"{value / 1000:.1f} ms"
+    return f"{value / 1000000:.2f} s"
+
+
+class TopicStats:
+    def __init__(self):
+        self.samples = 0
+        # samples measured and their total size
+        self.sized = 0
+        self.sized_bytes = 0
+        self.missed = 0
+        # source timestamps ahead of the reception timestamps (clocks not in sync)
+        self.clock_skew = 0
+        # publication handle -> last sequence number
+        self.last_sequence = {}
+        # per-second slots: second, samples
+        self.slot_second = [0] * WINDOW
+        self.slot_samples = [0] * WINDOW
+        # latency histograms of the current and previous window
+        self.latency = [0] * NUM_BUCKETS
+        self.previous_latency = [0] * NUM_BUCKETS
+        self.window_start = time.monotonic()
+
+    # size is the sample's serialized size, or None when it wasn't measured
+    def record(self, info, size=None):
+        now = time.monotonic()
+        self.samples += 1
+        if size is not None:
+            self.sized += 1
+            self.sized_bytes += size
+
+        second = int(now)
+        slot = second % WINDOW
+        if self.slot_second[slot] != second:
+            self.slot_second[slot] = second
+            self.slot_samples[slot] = 0
+        self.slot_samples[slot] += 1
+
+        sequence = info.publication_sequence_number.value
+        last = self.last_sequence.get(info.publication_handle)
+        if last is not None and sequence > last + 1:
+            self.missed += sequence - last - 1
+        if last is None or sequence > last:
+            self.last_sequence[info.publication_handle] = sequence
+
+        if now - self.window_start >= WINDOW:
+            self.window_start = now
+            self.previous_latency = self.latency
+            self.latency = [0] * NUM_BUCKETS
+        latency = time_seconds(info.reception_timestamp) - time_seconds(info.source_timestamp)
+        if latency < 0:
+            self.clock_skew += 1
+            latency = 0
+        self.latency[bucket_index(int(latency * 1000000))] += 1
+
+    # samples/s over the last WINDOW complete seconds, and bytes/s (None without sizes)
+    def rates(self):
+        second = int(time.monotonic())
+        samples = 0
+        for slot in range(WINDOW):
+            if second - WINDOW <= self.slot_second[slot] < second:
+                samples += self.slot_samples[slot]
+        samples_rate = samples / WINDOW
+        return samples_rate, samples_rate * self.sized_bytes / self.sized if self.sized else None
+
+    def render(self):
+        samples_rate, bytes_rate = self.rates()
+        throughput = "n/a" if bytes_rate is None else f"{bytes_rate / 1024:.1f}"
+        size = "" if not self.sized else f", ~{self.sized_bytes // self.sized} bytes each"
+        lines = [f"{samples_rate:.1f} samples/s  {throughput} KiB/s  "
+                 f"({self.samples} samples{size})  missed: {self.missed}"]
+
+        # the histograms only rotate on new samples, leave out the ones older than the window
+        age = time.monotonic() - self.window_start
+        if age < WINDOW:
+            counts = [a + b for a, b in zip(self.latency, self.previous_latency)]
+        elif age < 2 * WINDOW:
+            counts = list(self.latency)
+        else:
+            counts = [0] * NUM_BUCKETS
+        total = sum(counts)
+        if not total:
+            return "\n".join(lines + [f"latency: no samples in the last {WINDOW} s"])
+        if self.clock_skew:
+            lines.append(f"latency: {self.clock_skew} samples sent 'after' they were received, clocks not in sync")
+
+        # value at each percentile, the lowest value of the bucket it falls in
+        values = []
+        cumulative = 0
+        percentiles = iter(PERCENTILES)
+        percentile = next(percentiles)
+        for index, count in enumerate(counts):
+            cumulative += count
+            while percentile is not None and count and cumulative >= total * percentile / 100:
+                values.append(f"p{percentile:g} {format_us(bucket_value(index))}")
+                percentile = next(percentiles, None)
+        lines.append("latency: " + "  ".join(values))
+
+        # one bar per power of two that has samples
+        octaves = {}
+        for index, count in enumerate(counts):
+            if count:
+                low = bucket_value(index)
+                octave = low.bit_length()
+                octaves[octave] = octaves.get(octave, 0) + count
+        widest = max(octaves.values())
+        for octave, count in sorted(octaves.items()):
+            low = 0 if octave == 0 else 1 << (octave - 1)
+            bar = "#" * max(1, round(count * 30 / widest))
+            lines.append(f"  >= {format_us(low):>9}  {bar} {count}")
+        return "\n".join(lines)
@@ -2,40 +2,119 @@ import rti.connextdds as dds
 import time
 import argparse
 from textual.app import App, ComposeResult
-from textual.widgets import DataTable, Header, Footer, Static
+from textual.widgets import DataTable, Header, Footer, Static, Tree
 from textual.containers import Container
 from textual.screen import Screen
 from textual import events
 import logging
 from textual.logging import TextualHandler
 import asyncio
+from collections import deque
+from dds_store import Participant, Endpoint, guid_key, guid_str
+from dds_metrics import DiscoveryMetrics, DEFAULT_INTERVAL
+from dds_topic_stats import TopicStats
 
 logging.basicConfig(
     level="NOTSET",
     handlers=[TextualHandler()],
 )
 
-# Global maps
+# Global maps, keyed by 16-byte GUIDs (see dds_store.py). The tables use their hex form
+# as row keys.
 endpoints = {}
 participants = {}
+# participant key -> keys of its endpoints in discovery order, appended by the discovery
+# listeners (endpoints are never removed, so a screen only has to add the keys past the
+# ones it already shows)
+participant_endpoints = {}
+# DiscoveryMetrics with --metrics/--metrics-file
+metrics = None
+
+# Samples kept per subscribed topic, the most recent shown, and the shortest time between
+# two repaints of the samples
+SAMPLE_HISTORY = 1000
+SHOWN_SAMPLES = 20
+FRAME_INTERVAL = 0.05
+# Seconds between updates of the statistics panel
+STATS_INTERVAL = 1
+# One sample in SIZE_EVERY is serialized to measure bytes/s
+SIZE_EVERY = 64
+# Seconds between checks for new endpoints of the participant shown
+ENDPOINTS_INTERVAL = 0.5
+# Characters of a sample shown on its line in the sample list
+PREVIEW_WIDTH = 120
+
+
+# Serialized size of a sample (None when the Connext version can't serialize DynamicData)
+def sample_size(data):
+  to_cdr_buffer = getattr(data, "to_cdr_buffer", None)
+  return len(to_cdr_buffer()) if to_cdr_buffer is not None else None
+
+
+# (label, value) of the fields of a DynamicData struct, or the elements of a sequence or
+# array, without formatting anything. Fields are read one at a time, so callers only pay
+# for the ones they show. Primitive values have no children.
+def sample_children(value):
+  if isinstance(value, (list, tuple)):
+    return [(f"[{i}]", element) for i, element in enumerate(value)]
+  if not isinstance(value, dds.DynamicData):
+    return []
+  try:
+    return [(member.name, lambda name=member.name: value[name]) for member in value.type.members()]
+  except (AttributeError, TypeError):
+    # sequences and arrays have no members, their elements are indexed
+    return [(f"[{i}]", lambda i=i: value[i]) for i in range(value.member_count)]
+
+
+def child_value(value):
+  try:
+    return value() if callable(value) else value
+  except Exception as e:
+    return f"<{e}>"
+
+
+# One line for the sample list: the top-level fields until PREVIEW_WIDTH characters,
+# nested values are not expanded
+def sample_preview(data):
+  parts = []
+  width = 0
+  for name, value in sample_children(data):
+    value = child_value(value)
+    if isinstance(value, (dds.DynamicData, list, tuple)):
+      part = f"{name}={{...}}"
+    else:
+      part = f"{name}={value!r}"
+    parts.append(part)
+    width += len(part) + 2
+    if width >= PREVIEW_WIDTH:
+      break
+  return ", ".join(parts)[:PREVIEW_WIDTH]
+
+
+# Listener of a subscribed topic. take() runs in the middleware's thread and the samples
+# go into a ring buffer (deque appends are atomic); the screen's task is woken through the
+# event loop once per batch rather than once per sample. The samples of take() are loaned
+# and invalid once the loop is done, the ring buffer keeps copies.
+class SampleListener(dds.DynamicData.DataReaderListener):
+  def __init__(self, loop, wakeup):
+    super().__init__()
+    self.loop = loop
+    self.wakeup = wakeup
+    self.samples = deque(maxlen=SAMPLE_HISTORY)
+    self.received = 0
+    self.notified = False
+    self.stats = TopicStats()
 
+  def on_data_available(self, reader):
+    for data, info in reader.take():
+      if info.valid:
+        self.received += 1
+        self.samples.append((self.received, dds.DynamicData(data)))
+        self.stats.record(info, sample_size(data) if self.received % SIZE_EVERY == 1 else None)
+    if not self.notified:
+      self.notified = True
+      self.loop.call_soon_threadsafe(self.wakeup.set)
 
-class Participant:
-    def __init__(self, name=None, ip=None):
-        self.name = name
-        self.ip = ip
-
-
-class Endpoint:
-  def __init__(self, key=None, topic_name=None, type_name=None, type=None, kind=None, p_ip=None, p_name=None, p_key=None):
-      self.key = key,
-      self.topic_name = topic_name
-      self.type_name = type_name
-      self.type = type
-      self.kind = kind
-      self.p_ip = p_ip
-      self.p_name = p_name
-      self.p_key = p_key
 
 class ParticipantListScreen(Screen):
 
@@ -45,6 +124,9 @@ class ParticipantListScreen(Screen):
     self.table = DataTable()
     self.selected_key = None
     self.participant = participant
+    # View model: row key (participant key in hex) -> (name, ip) as shown in the table
+    self.rows = {}
+    self.columns = None
 
   def compose(self) -> ComposeResult:
     logging.debug("[ParticipantsScreen.compose] called")
@@ -56,37 +138,50 @@ class ParticipantListScreen(Screen):
     yield Footer()
 
   async def on_mount(self) -> None:
+    self.columns = self.table.add_columns("Participant Name", "IP")
+    self.table.cursor_type = "row"
+    self.table.focus()
     await self.refresh_table()
 
+  # Apply only the differences between participants and the rows shown, so the table
+  # keeps its scroll position and the redraw is proportional to the changes
   async def refresh_table(self):
     # logging.debug(f"[ParticipantsScreen.refresh_table] called, participants: {len(participants)}")
-    prev_selected = self.selected_key
-    self.table.clear()
-    if not self.table.columns:
-      self.table.add_columns("Participant Name", "IP")
-  
-    for idx, (p_key, participant) in enumerate(participants.items()):
-      # logging.debug(f"[ParticipantsScreen.refresh_table] adding row: {participant.name}, {participant.ip}, key={p_key}")
-      self.table.add_row(participant.name, participant.ip, key=p_key)
-
-
-    self.table.cursor_type = "row"
-    self.table.focus()
-    # Restore selection by row index, not key
-    if self.selected_key is not None:
-      for idx, row in enumerate(self.table.rows):
-        if row == self.selected_key:
-          self.table.move_cursor(row=idx)
-          break
-    # logging.debug(f"[ParticipantsScreen.refresh_table] table row count: {len(self.table.rows)}")
-    self.table.refresh()
+    current = {guid_str(p_key): (participant.name, participant.ip) for p_key, participant in participants.items()}
+
+    for row_key in [row_key for row_key in self.rows if row_key not in current]:
+      self.table.remove_row(row_key)
+      del self.rows[row_key]
+
+    for row_key, values in current.items():
+      shown = self.rows.get(row_key)
+      if shown is None:
+        self.table.add_row(*values, key=row_key)
+      elif shown != values:
+        for column, value, shown_value in zip(self.columns, values, shown):
+          if value != shown_value:
+            self.table.update_cell(row_key, column, value)
+      else:
+        continue
+      self.rows[row_key] = values
+
+    # Keep the cursor on the selected participant when rows above it were removed, or
+    # follow the cursor if the selected one is gone
+    if self.selected_key is not None and self.selected_key.value in self.rows:
+      row = self.table.get_row_index(self.selected_key)
+      if row != self.table.cursor_row:
+        self.table.move_cursor(row=row)
+    elif self.table.row_count:
+      self.selected_key = self.table.coordinate_to_cell_key(self.table.cursor_coordinate).row_key
+    else:
+      self.selected_key = None
 
   async def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
     self.selected_key = event.row_key
 
   async def on_key(self, event: events.Key) -> None:
     if event.key == "enter" and self.selected_key is not None:
-      await self.app_ref.push_screen(EndpointListScreen(self.app_ref, self.selected_key, self.participant))
+      await self.app_ref.push_screen(EndpointListScreen(self.app_ref, bytes.fromhex(self.selected_key.value), self.participant))
 
 class EndpointListScreen(Screen):
   def __init__(self, app_ref, participant_key, participant):
@@ -96,6 +191,8 @@ class EndpointListScreen(Screen):
     self.table = DataTable()
     self.selected_key = None
     self.participant = participant
+    # endpoint keys of the participant already in the table
+    self.shown = 0
 
   def compose(self) -> ComposeResult:
     yield Header()
@@ -106,12 +203,18 @@ class EndpointListScreen(Screen):
     yield Footer()
 
   async def on_mount(self) -> None:
-    self.table.clear()
     self.table.add_columns("Topic Name", "Kind")
-    for key, entity in endpoints.items():
-      if getattr(entity, 'p_key', None) == self.participant_key:
-        self.table.add_row(entity.topic_name, entity.kind, key=key)
     self.table.cursor_type = "row"
+    self.add_new_endpoints()
+    self.set_interval(ENDPOINTS_INTERVAL, self.add_new_endpoints)
+
+  def add_new_endpoints(self):
+    # the listeners may append meanwhile, only count the keys added here
+    new_keys = participant_endpoints.get(self.participant_key, [])[self.shown:]
+    for key in new_keys:
+      entity = endpoints[key]
+      self.table.add_row(entity.topic_name, entity.kind, key=guid_str(key))
+    self.shown += len(new_keys)
 
   async def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
     self.selected_key = event.row_key
@@ -122,7 +225,7 @@ class EndpointListScreen(Screen):
   async def on_key(self, event: events.Key) -> None:
     if event.key == "enter" and self.selected_key is not None:
 
-      endpoint = endpoints.get(self.selected_key)
+      endpoint = endpoints.get(bytes.fromhex(self.selected_key.value))
       if endpoint:
         # logging.debug(f"[action_select] Opening TopicDetailScreen for endpoint: {endpoint.topic_name}")
         
@@ -136,13 +239,23 @@ class ParticipantDetailScreen(Screen):
     super().__init__()
     self.endpoint = endpoint
     self.participant = participant
-    self.sample_lines = []
-    self.table = DataTable()
+    self.reader = None
+    self.listener = None
+    self._sub_task = None
+    # Sample list: the number of the sample on the last line (None follows the newest),
+    # the line of the cursor counted from the last line, the (number, data) shown and their
+    # previews by number
+    self.anchor = None
+    self.cursor_from_bottom = 0
+    self.window = []
+    self.previews = {}
 
   def compose(self) -> ComposeResult:
     yield Header()
-    yield Container(self.table)
+    yield Static("Directions: Up/Down/PgUp/PgDn to scroll the samples, End to follow the newest, Enter to open a sample.", id="directions")
     # from textual.widgets import Static
+    self.stats_widget = Static("")
+    yield self.stats_widget
     self.output_widget = Static("Waiting for samples...\n")
     yield self.output_widget
     yield Footer()
@@ -172,63 +285,169 @@ class ParticipantDetailScreen(Screen):
       # logging.debug(f"TOPIC NAME: {self.endpoint.topic_name}  TYPE: {self.endpoint.type}")
       
       dynamic_topic = dds.DynamicData.Topic(self.participant, self.endpoint.topic_name, self.endpoint.type)
-      dynamic_reader = dds.DynamicData.DataReader(dynamic_topic)
+      self.reader = dds.DynamicData.DataReader(dynamic_topic)
+      wakeup = asyncio.Event()
+      listener = self.listener = SampleListener(asyncio.get_running_loop(), wakeup)
+      self.reader.set_listener(listener, dds.StatusMask.DATA_AVAILABLE)
+      self.set_interval(STATS_INTERVAL, lambda: self.stats_widget.update(listener.stats.render()))
       self.output_widget.update(f"Subscribed to topic '{self.endpoint.topic_name}' with discovered type.\nWaiting for samples...\n")
 
+      # Sleep until the listener has samples, then repaint at most once per FRAME_INTERVAL
       while True:
-        await asyncio.sleep(0.1)
-        for data, info in dynamic_reader.take():
-          if info.valid:
-            line = f"Sample: {data}"
-            self.sample_lines.append(line)
-
-
-            self.sample_lines = self.sample_lines[-20:]
-            self.output_widget.update("\n".join(self.sample_lines))
+        await wakeup.wait()
+        wakeup.clear()
+        listener.notified = False
+        self.render_samples()
+        await asyncio.sleep(FRAME_INTERVAL)
+    except asyncio.CancelledError:
+      raise
     except Exception as e:
       self.output_widget.update(f"Error: {e}")
 
+  # Draw the SHOWN_SAMPLES lines of the sample list, only the samples new to the list are
+  # formatted (a preview of their top-level fields)
+  def render_samples(self):
+    if self.listener is None or not self.listener.samples:
+      return
+    # copied in one call, the listener may append meanwhile
+    samples = tuple(self.listener.samples)
+    first, newest = samples[0][0], samples[-1][0]
+    bottom = newest if self.anchor is None else min(max(self.anchor, first + SHOWN_SAMPLES - 1), newest)
+    self.anchor = None if bottom >= newest else bottom
+    self.window = samples[max(0, bottom - first - SHOWN_SAMPLES + 1):bottom - first + 1]
+    self.previews = {number: self.previews.get(number) or sample_preview(data) for number, data in self.window}
+
+    cursor = self.cursor_row()
+    lines = [f"{self.listener.received} samples received" + ("" if self.anchor is None else f", showing up to #{bottom} (End to follow)")]
+    for row, (number, data) in enumerate(self.window):
+      lines.append(f"{'>' if row == cursor else ' '} #{number} {self.previews[number]}")
+    self.output_widget.update("\n".join(lines))
+
+  # line of the cursor in the list, on the first line while the list is shorter
+  def cursor_row(self):
+    return max(len(self.window) - 1 - self.cursor_from_bottom, 0)
+
+  # Move the cursor, scrolling the list back/forward by lines past its top/bottom
+  def move_cursor(self, lines):
+    if not self.window:
+      return
+    cursor = self.cursor_row() + lines
+    if cursor < 0 or cursor >= len(self.window):
+      bottom = self.window[-1][0] + (cursor if cursor < 0 else cursor - len(self.window) + 1)
+      self.anchor = None if bottom >= self.listener.samples[-1][0] else bottom
+      cursor = min(max(cursor, 0), len(self.window) - 1)
+    self.cursor_from_bottom = len(self.window) - 1 - cursor
+    self.render_samples()
+
+  async def on_key(self, event: events.Key) -> None:
+    if event.key == "up":
+      self.move_cursor(-1)
+    elif event.key == "down":
+      self.move_cursor(1)
+    elif event.key == "pageup":
+      self.move_cursor(-SHOWN_SAMPLES)
+    elif event.key == "pagedown":
+      self.move_cursor(SHOWN_SAMPLES)
+    elif event.key == "end":
+      self.anchor = None
+      self.cursor_from_bottom = 0
+      self.render_samples()
+    elif event.key == "enter" and self.window:
+      number, data = self.window[self.cursor_row()]
+      await self.app.push_screen(SampleTreeScreen(self.endpoint.topic_name, number, data))
+
+  async def on_unmount(self) -> None:
+    if self._sub_task is not None:
+      self._sub_task.cancel()
+    if self.reader is not None:
+      self.reader.set_listener(None, dds.StatusMask.NONE)
+      self.reader.close()
+
+
+# Fields of one sample as a tree, a node's children are read and formatted when it is
+# expanded
+class SampleTreeScreen(Screen):
+  def __init__(self, topic_name, number, data):
+    super().__init__()
+    self.data = data
+    self.tree = Tree(f"{topic_name} #{number}")
+
+  def compose(self) -> ComposeResult:
+    yield Header()
+    yield Static("Directions: Enter/Space expands or collapses a field, b to go back.", id="directions")
+    yield self.tree
+    yield Footer()
+
+  async def on_mount(self) -> None:
+    self.add_children(self.tree.root, self.data)
+    self.tree.root.expand()
+    self.tree.focus()
+
+  def add_children(self, node, value):
+    for name, child in sample_children(value):
+      child = child_value(child)
+      if isinstance(child, (dds.DynamicData, list, tuple)):
+        node.add(name, data=child, allow_expand=True)
+      else:
+        node.add_leaf(f"{name} = {child!r}")
+
+  async def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+    if event.node.data is not None and not event.node.children:
+      self.add_children(event.node, event.node.data)
+
 
 # Listener for subscription discovery
 class SubscriptionListener(dds.SubscriptionBuiltinTopicData.DataReaderListener):
   def on_data_available(self, reader):
-
+    start = time.perf_counter()
+    samples = 0
     for data, info in reader.take():
+      samples += 1
       if info.valid:
-        key_list = data.key.value
-        key_string = str(key_list)
+        key = guid_key(data.key.value)
 
         type_name = data.type_name
         topic_name = data.topic_name
 
-        p_key_list = data.participant_key.value
-        p_key_string = str(p_key_list)
+        p_key = guid_key(data.participant_key.value)
 
-        reader = Endpoint(topic_name=topic_name,type_name=type_name, type=data.type, kind="Reader", p_key=p_key_string, key=key_string)
+        reader = Endpoint(topic_name=topic_name,type_name=type_name, type=data.type, kind="Reader", p_guid=p_key)
 
-        if key_string not in endpoints:
-          endpoints[key_string] = reader
+        if key not in endpoints:
+          endpoints[key] = reader
+          participant_endpoints.setdefault(p_key, []).append(key)
+          if metrics is not None:
+            metrics.discovered.inc("endpoint")
+
+    if metrics is not None:
+      metrics.callback("subscription", start, samples)
 
 # Listener for publication discovery
 class PublicationListener(dds.PublicationBuiltinTopicData.DataReaderListener):
 
   def on_data_available(self, reader):
-
+    start = time.perf_counter()
+    samples = 0
     for data, info in reader.take():
+      samples += 1
       if info.valid:
-        key_list = data.key.value
-        key_string = str(key_list)
+        key = guid_key(data.key.value)
 
         type_name = data.type_name
         topic_name = data.topic_name
 
-        p_key_list = data.participant_key.value
-        p_key_string = str(p_key_list)
+        p_key = guid_key(data.participant_key.value)
 
-        writer = Endpoint(topic_name=topic_name,type_name=type_name, type=data.type, kind="Writer", p_key=p_key_string, key=key_string)
+        writer = Endpoint(topic_name=topic_name,type_name=type_name, type=data.type, kind="Writer", p_guid=p_key)
 
-        if key_string not in endpoints:
-          endpoints[key_string] = writer
+        if key not in endpoints:
+          endpoints[key] = writer
+          participant_endpoints.setdefault(p_key, []).append(key)
+          if metrics is not None:
+            metrics.discovered.inc("endpoint")
+
+    if metrics is not None:
+      metrics.callback("publication", start, samples)
 
 
 class RTISPY(App):
@@ -252,11 +471,14 @@ class RTISPY(App):
     # logging.debug("[on_mount] refreshing participants list")
     self.update_participants(self.participant)
     self.set_interval(self.interval, lambda: self.update_participants(self.participant))
+    if metrics is not None:
+      self.set_interval(1, metrics.write_if_due)
     await self.push_screen(ParticipantListScreen(self, self.participant))
 
 
   def update_participants(self, participant):
     # logging.debug("[update_participants]")
+    tick_start = time.perf_counter()
 
     # Get current participants
     p_list = participant.discovered_participants()
@@ -271,11 +493,12 @@ class RTISPY(App):
 
         participant_info = Participant(name, ip)
 
-        key_list = data.key.value
-        key_string = str(key_list)
-        # logging.debug(f" Adding Participant {key_string}")
+        key = guid_key(data.key.value)
+        # logging.debug(f" Adding Participant {guid_str(key)}")
 
-        participants[key_string] = participant_info
+        if metrics is not None and key not in participants:
+          metrics.discovered.inc("participant")
+        participants[key] = participant_info
 
     # Refresh ParticipantsScreen if it's the current screen
     if self.screen_stack and isinstance(self.screen_stack[-1], ParticipantListScreen):
@@ -283,16 +506,28 @@ class RTISPY(App):
         if asyncio.iscoroutine(coro):
             asyncio.create_task(coro)
 
-    async def action_back(self) -> None:
-      # logging.warning("[action_back] before await pop_screen")
+    if metrics is not None:
+      metrics.tick_seconds.observe(time.perf_counter() - tick_start)
+
+  async def action_back(self) -> None:
+    # logging.warning("[action_back] before await pop_screen")
+    # the participant list (above the default screen) stays
+    if len(self.screen_stack) > 2:
       await self.pop_screen()
 
 def main():
   parser = argparse.ArgumentParser(description="Discover all readers and writers on a DDS domain.")
   parser.add_argument("-d", "--domain", type=int, default=1, help="DDS domain ID (default: 1)")
   parser.add_argument("-i", "--interval", type=float, default=10, help="Refresh interval in seconds (default: 2.0)")
+  parser.add_argument("--metrics", action="store_true", help="Collect discovery metrics and print a summary at the end")
+  parser.add_argument("--metrics-file", help="Prometheus textfile to write the discovery metrics to (implies --metrics)")
+  parser.add_argument("--metrics-interval", type=float, default=DEFAULT_INTERVAL, help=f"Seconds between writes of the metrics file (default: {DEFAULT_INTERVAL})")
   args = parser.parse_args()
 
+  global metrics
+  if args.metrics or args.metrics_file:
+    metrics = DiscoveryMetrics(args.metrics_file, args.metrics_interval)
+
   # Create participant in disabled state
   participant_factory_qos = dds.DomainParticipantFactoryQos()
   participant_factory_qos.entity_factory.autoenable_created_entities = False
@@ -312,5 +547,9 @@ def main():
   app = RTISPY(participant, interval=args.interval)
   app.run()
 
+  if metrics is not None:
+    metrics.write()
+    print(metrics.summary())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file